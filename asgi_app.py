@@ -0,0 +1,251 @@
+"""异步（ASGI）运行模式
+
+``AsyncApp`` 是一个很小的 ASGI 应用：按路由把请求交给协程处理函数，
+没有匹配的请求（以及处理函数返回 None 的请求）转交给 Flask 应用，
+由 asgiref 在线程中执行。协程处理函数在 Flask 应用的请求上下文中执行，
+前后运行应用的 before_request / after_request 钩子（运行指标、响应压缩等），
+与同步路径的请求处理流程一致；请求和响应仍然使用 Flask 的对象，
+所以 ETag、条件请求等辅助函数可以在同步和异步两条路径上共用。
+
+依赖 uvicorn、aiosqlite、asgiref 和 greenlet，均为可选依赖，只在异步模式下需要。
+"""
+
+import importlib.util
+import io
+import socket
+import sys
+import traceback
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.exceptions import HTTPException, InternalServerError
+from werkzeug.routing import Map, Rule
+
+from sqlite_profile import register_pragmas
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:  # asgiref 为可选依赖
+    WsgiToAsgi = None
+
+try:
+    import uvicorn
+except ImportError:  # uvicorn 为可选依赖
+    uvicorn = None
+
+# 同步驱动到异步驱动的对应关系
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite"}
+
+
+class AsyncApp:
+    def __init__(self, fallback):
+        self.url_map = Map()
+        self.handlers = {}
+        self.fallback = fallback
+        self.startup_hooks = []
+        self.shutdown_hooks = []
+        self._fallback_app = None
+
+    def route(self, rule, methods):
+        """注册协程处理函数，用法与 Flask 的 app.route 相同"""
+
+        def decorator(handler):
+            self.url_map.add(Rule(rule, methods=methods, endpoint=handler.__name__))
+            self.handlers[handler.__name__] = handler
+            return handler
+
+        return decorator
+
+    def on_startup(self, hook):
+        self.startup_hooks.append(hook)
+        return hook
+
+    def on_shutdown(self, hook):
+        self.shutdown_hooks.append(hook)
+        return hook
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            await self.forward(scope, receive, send)
+            return
+
+        adapter = self.url_map.bind("", path_info=scope["path"])
+        try:
+            endpoint, values = adapter.match(method=scope["method"])
+        except HTTPException:
+            # 404 和 405 都交给 Flask，那里可能有同路径的其他方法
+            await self.forward(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        environ = _wsgi_environ(scope, body)
+        response = await self.dispatch(endpoint, values, environ)
+        if response is None:
+            await self.forward(scope, _replay(body), send)
+            return
+        await _send_response(response, environ, send)
+
+    async def dispatch(self, endpoint, values, environ):
+        """在 Flask 请求上下文中执行处理函数，返回经过 after_request 钩子处理的响应
+
+        处理函数的返回值与 Flask 视图函数相同（响应对象或 (内容, 状态码) 等），
+        返回 None 时不运行 after_request，请求随后整个交给 Flask 处理。
+        """
+        app = self.fallback
+        with app.request_context(environ) as context:
+            try:
+                response = app.preprocess_request()
+                if response is None:
+                    response = await self.handlers[endpoint](context.request, **values)
+                    if response is None:
+                        return None
+                response = app.make_response(response)
+            except HTTPException as error:
+                response = error.get_response(environ)
+            except Exception:
+                traceback.print_exc()
+                response = InternalServerError().get_response(environ)
+            return app.process_response(response)
+
+    async def forward(self, scope, receive, send):
+        """交给 Flask 应用处理"""
+        if self._fallback_app is None:
+            if WsgiToAsgi is None:
+                raise RuntimeError("asgiref is required to forward requests to Flask")
+            self._fallback_app = WsgiToAsgi(self.fallback)
+        await self._fallback_app(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    for hook in self.startup_hooks:
+                        await hook()
+                except Exception:
+                    await send(
+                        {
+                            "type": "lifespan.startup.failed",
+                            "message": traceback.format_exc(),
+                        }
+                    )
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for hook in self.shutdown_hooks:
+                    await hook()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+async def _read_body(receive):
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        more_body = message.get("more_body", False)
+    return b"".join(chunks)
+
+
+def _replay(body):
+    """已经读取过的请求体，重新提供给 Flask"""
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return receive
+
+
+def _wsgi_environ(scope, body):
+    """由 ASGI scope 构造 WSGI environ，以便直接使用 Werkzeug 的 Request"""
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": False,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        if name in environ:
+            value = f"{environ[name]},{value}"
+        environ[name] = value
+    return environ
+
+
+async def _send_response(response, environ, send):
+    app_iter, _, headers = response.get_wsgi_response(environ)
+    body = b"".join(app_iter)
+    headers = [
+        (name.lower().encode("latin-1"), value.encode("latin-1"))
+        for name, value in headers
+    ]
+    await send(
+        {
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": headers,
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+def create_async_session(engine, engine_options=None, pragmas=None, echo=False):
+    """基于同步引擎的数据库地址创建异步引擎和会话工厂"""
+    url = engine.url
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver for database backend: {url.drivername}")
+    async_engine = create_async_engine(
+        url.set(drivername=driver), echo=echo, **(engine_options or {})
+    )
+    register_pragmas(async_engine.sync_engine, pragmas)
+    return async_engine, async_sessionmaker(async_engine, expire_on_commit=False)
+
+
+def serve(app, host, port, fd=None, ready=None):
+    """用 uvicorn 运行 ASGI 应用
+
+    fd 为继承的监听套接字；ready 在应用启动（lifespan startup）完成后调用。
+    """
+    missing = [
+        name
+        for name in ("uvicorn", "asgiref", "aiosqlite", "greenlet")
+        if importlib.util.find_spec(name) is None
+    ]
+    if missing:
+        sys.exit(f"异步模式缺少依赖，请先安装: pip install {' '.join(missing)}")
+    if ready is not None:
+
+        @app.on_startup
+        async def notify():
+            ready()
+
+    if fd is None:
+        uvicorn.run(app, host=host, port=port, log_level="info")
+        return
+    # uvicorn 的 fd 参数按 Unix 套接字处理，这里自己包装成套接字对象传入
+    config = uvicorn.Config(app, log_level="info")
+    uvicorn.Server(config).run(sockets=[socket.socket(fileno=fd)])
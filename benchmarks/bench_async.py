@@ -0,0 +1,178 @@
+"""同步（prefork + 线程池）与异步（ASGI）运行模式的并发基准
+
+用法: python benchmarks/bench_async.py [--clients 1000] [--duration 10]
+
+在临时数据库上分别以 --server production 和 --server async 启动 main.py，
+先批量写入测试用户，然后让 --clients 个客户端同时循环发送请求
+（60% 列表分页、30% 按ID读取、10% 更新），每个请求新建一个连接。
+输出每种模式的吞吐量、错误数以及 p50/p99 延迟。
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, port, database, args):
+    command = [
+        sys.executable,
+        str(ROOT / "main.py"),
+        "--server",
+        mode,
+        "--port",
+        str(port),
+        "--db-profile",
+        "production",
+        "--database-uri",
+        f"sqlite:///{database}",
+        "--workers",
+        str(args.workers),
+        "--threads",
+        str(args.threads),
+    ]
+    process = subprocess.Popen(
+        command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/hi", timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{mode} server did not start on port {port}")
+
+
+def seed_users(port, count):
+    items = [
+        {"username": f"bench{i}", "email": f"bench{i}@example.com"}
+        for i in range(count)
+    ]
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/api/users/bulk",
+        data=json.dumps(items).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=60):
+        pass
+
+
+def make_request(records):
+    choice = random.random()
+    user_id = random.randint(1, records)
+    if choice < 0.6:
+        return f"GET /api/users?limit=20&after={user_id} HTTP/1.1", b""
+    if choice < 0.9:
+        return f"GET /api/users/{user_id} HTTP/1.1", b""
+    body = json.dumps({"email": f"changed{random.randint(0, 10**6)}@example.com"})
+    return f"PUT /api/users/{user_id} HTTP/1.1", body.encode("utf-8")
+
+
+async def send_request(port, records):
+    request_line, body = make_request(records)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        head = (
+            f"{request_line}\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+        )
+        writer.write(head.encode("ascii") + body)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b" ", 2)[1])
+
+
+async def client(port, records, deadline, latencies, errors):
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            status = await send_request(port, records)
+        except (OSError, IndexError, ValueError):
+            errors.append(1)
+            continue
+        if status >= 500:
+            errors.append(1)
+        else:
+            latencies.append(time.perf_counter() - started)
+
+
+async def load(port, clients, records, duration):
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    await asyncio.gather(
+        *(client(port, records, deadline, latencies, errors) for _ in range(clients))
+    )
+    return latencies, errors
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def bench_mode(mode, args):
+    with tempfile.TemporaryDirectory() as directory:
+        port = free_port()
+        process = start_server(mode, port, Path(directory) / "bench.db", args)
+        try:
+            seed_users(port, args.records)
+            started = time.perf_counter()
+            latencies, errors = asyncio.run(
+                load(port, args.clients, args.records, args.duration)
+            )
+            elapsed = time.perf_counter() - started
+        finally:
+            process.terminate()
+            process.wait(timeout=60)
+
+    latencies.sort()
+    if not latencies:
+        print(f"{mode:<12} no successful requests ({len(errors)} errors)")
+        return
+    print(
+        f"{mode:<12} {len(latencies) / elapsed:8.0f} req/s   {len(errors):6d} errors"
+        f"   p50 {percentile(latencies, 0.50) * 1000:8.1f} ms"
+        f"   p99 {percentile(latencies, 0.99) * 1000:8.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async server benchmark")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument(
+        "--modes", nargs="+", default=["production", "async"], help="Server modes"
+    )
+    args = parser.parse_args()
+    print(
+        f"{args.clients} clients, {args.duration:.0f}s, "
+        f"sync: {args.workers} worker(s) x {args.threads} threads, async: 1 process"
+    )
+    for mode in args.modes:
+        bench_mode(mode, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""orjson 编码器与 Flask 标准库编码器的等价性检查和微基准
+
+用法: python benchmarks/bench_json.py
+
+先逐个用例比较两者 response() 和 dumps() 的输出字节，任何不一致都以非零状态退出；
+然后测量 1000/10000 个用户列表的纯编码耗时，以及 Schema dump 加编码的总耗时。
+"""
+
+import sys
+import timeit
+from datetime import UTC, date, datetime
+from decimal import Decimal
+from pathlib import Path
+from uuid import UUID
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from flask.json.provider import DefaultJSONProvider
+
+import main
+from json_provider import COMPACT_SEPARATORS, OrjsonProvider, orjson
+
+CASES = [
+    {"message": "Hello, World!"},
+    {"name": "张三"},
+    {"name": "emoji 😀", "ascii": 'a"b\\c\n\t\x00\x1f\x7f'},
+    {"b": 1, "a": [1, 2, {"d": None, "c": True}]},
+    [{"id": i, "username": f"user{i}", "email": None} for i in range(3)],
+    {"floats": [0.1, 1.5, 1e20, 1e-7, 2.5e-5, -0.0, 123456789.123]},
+    {"big": 2**64, "small": -(2**63)},
+    {"when": datetime(2024, 1, 2, 3, 4, 5, tzinfo=UTC)},
+    {"day": date(2024, 1, 2), "uuid": UUID(int=1), "price": Decimal("1.10")},
+    {2: "int key", 1: "int key"},
+    "plain string",
+    42,
+    None,
+    [],
+    {},
+]
+
+
+def check_equivalence():
+    failures = 0
+    stdlib = DefaultJSONProvider(main.app)
+    fast = OrjsonProvider(main.app)
+    for debug in (False, True):
+        main.app.debug = debug
+        for case in CASES:
+            with main.app.app_context():
+                expected = stdlib.response(case).get_data()
+                actual = fast.response(case).get_data()
+            if expected != actual:
+                failures += 1
+                print(f"response mismatch (debug={debug}) {case!r}")
+                print(f"  stdlib: {expected!r}\n  orjson: {actual!r}")
+    main.app.debug = False
+    for case in CASES:
+        expected = stdlib.dumps(case, separators=COMPACT_SEPARATORS)
+        actual = fast.dumps(case, separators=COMPACT_SEPARATORS)
+        if expected != actual:
+            failures += 1
+            print(f"dumps mismatch {case!r}")
+            print(f"  stdlib: {expected!r}\n  orjson: {actual!r}")
+    return failures
+
+
+def bench(label, baseline, candidate, number):
+    base = min(timeit.repeat(baseline, number=number, repeat=5)) / number
+    fast = min(timeit.repeat(candidate, number=number, repeat=5)) / number
+    print(
+        f"{label:<40} stdlib {base * 1e3:9.3f} ms"
+        f"   orjson {fast * 1e3:9.3f} ms   x{base / fast:5.1f}"
+    )
+
+
+def run_benchmarks():
+    stdlib = DefaultJSONProvider(main.app)
+    fast = OrjsonProvider(main.app)
+    schema = main.fast_schema.compiled(main.UserResponseSchema, many=True)
+    for count in (1000, 10000):
+        users = [
+            main.User(id=i, username=f"user{i}", email=f"user{i}@example.com")
+            for i in range(count)
+        ]
+        data = schema.dump(users)
+        number = max(1, 20000 // count)
+        with main.app.app_context():
+            bench(
+                f"encode x{count}",
+                lambda data=data: stdlib.response(data),
+                lambda data=data: fast.response(data),
+                number,
+            )
+            bench(
+                f"dump + encode x{count}",
+                lambda users=users: stdlib.response(schema.dump(users)),
+                lambda users=users: fast.response(schema.dump(users)),
+                number,
+            )
+
+
+if __name__ == "__main__":
+    if orjson is None:
+        print("orjson is not installed")
+        sys.exit(1)
+    failures = check_equivalence()
+    if failures:
+        print(f"{failures} mismatches between orjson and stdlib output")
+        sys.exit(1)
+    print("orjson provider output matches the stdlib provider byte for byte")
+    run_benchmarks()
@@ -0,0 +1,144 @@
+"""热重载耗时基准：从保存文件到第一个返回新代码结果的请求
+
+用法:
+    python benchmarks/bench_reload.py                      # 比较所有模式
+    python benchmarks/bench_reload.py --mode fork --runs 20
+
+把工作区复制到临时目录，在其中用 file_watcher.py 运行 main.py，然后反复修改
+main.py 中 /hi 返回的文字，以 5 ms 间隔轮询 /hi，直到响应里出现新的文字。
+耗时包含监控器的防抖时间（--debounce），各模式相同。
+"""
+
+import argparse
+import http.client
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 名称 -> file_watcher.py 参数
+MODES = {
+    "restart": ["--reload", "restart"],
+    "bluegreen": ["--reload", "bluegreen"],
+    "fork": ["--reload", "restart", "--fork-server"],
+    "bluegreen-fork": ["--reload", "bluegreen", "--fork-server"],
+}
+
+ORIGINAL = 'message="Hi!"'
+
+
+def fetch(url):
+    """返回响应内容，连接失败、响应不完整或非 200 时返回 None"""
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.read().decode()
+    except OSError:  # 包括连接失败和 HTTPError
+        return None
+    except http.client.HTTPException:  # 重启中的服务器可能断开连接，如 IncompleteRead
+        return None
+
+
+def wait_for(url, text, timeout):
+    """轮询直到响应包含 text，返回失败的请求数"""
+    deadline = time.monotonic() + timeout
+    failures = 0
+    while time.monotonic() < deadline:
+        body = fetch(url)
+        if body is not None and text in body:
+            return failures
+        if body is None:
+            failures += 1
+        time.sleep(0.005)
+    raise TimeoutError(f"{url} 在 {timeout} 秒内没有返回 {text!r}")
+
+
+def measure(mode, args):
+    with tempfile.TemporaryDirectory() as directory:
+        shutil.copytree(
+            ROOT,
+            directory,
+            dirs_exist_ok=True,
+            ignore=shutil.ignore_patterns(".git", "instance", "__pycache__"),
+        )
+        script = Path(directory) / "main.py"
+        source = script.read_text()
+        url = f"http://127.0.0.1:{args.port}/hi"
+        command = [
+            sys.executable,
+            "file_watcher.py",
+            "--debounce",
+            str(args.debounce),
+            "--port",
+            str(args.port),
+            *MODES[mode],
+            "--",
+            "--port",
+            str(args.port),
+            "--server",
+            args.server,
+            "--workers",
+            "2",
+        ]
+        watcher = subprocess.Popen(
+            command,
+            cwd=directory,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for(url, "Hi!", 60)
+            samples, failures = [], 0
+            for run in range(args.runs):
+                marker = f"Hi! reload {run}"
+                started = time.perf_counter()
+                script.write_text(source.replace(ORIGINAL, f'message="{marker}"'))
+                failures += wait_for(url, marker, 60)
+                samples.append((time.perf_counter() - started) * 1000)
+        finally:
+            watcher.send_signal(signal.SIGINT)
+            watcher.wait(60)
+    return samples, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot reload latency benchmark")
+    parser.add_argument(
+        "--mode",
+        action="append",
+        choices=sorted(MODES),
+        help="Mode to measure, repeatable (default: all)",
+    )
+    parser.add_argument("--runs", type=int, default=10, help="Reloads per mode")
+    parser.add_argument("--port", type=int, default=2041, help="Port to use")
+    parser.add_argument(
+        "--server",
+        choices=["dev", "production", "async"],
+        default="dev",
+        help="Server mode of main.py",
+    )
+    parser.add_argument(
+        "--debounce", type=float, default=0.05, help="Watcher debounce in seconds"
+    )
+    args = parser.parse_args()
+
+    if ORIGINAL not in (ROOT / "main.py").read_text():
+        sys.exit(f"main.py 中找不到 {ORIGINAL}")
+    print(f"server={args.server} debounce={args.debounce * 1000:.0f}ms")
+    print(f"{'mode':<16}{'median ms':>10}{'min ms':>9}{'max ms':>9}{'failed':>8}")
+    for mode in args.mode or MODES:
+        samples, failures = measure(mode, args)
+        print(
+            f"{mode:<16}{statistics.median(samples):10.1f}{min(samples):9.1f}"
+            f"{max(samples):9.1f}{failures:8d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
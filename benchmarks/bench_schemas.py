@@ -0,0 +1,178 @@
+"""已编译 Schema 与原生 marshmallow 的等价性检查和微基准
+
+用法: python benchmarks/bench_schemas.py
+
+先逐个用例比较两者的输出和错误信息，任何不一致都以非零状态退出；
+然后分别测量单个对象和 many=True 列表的 dump/load 耗时。
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from marshmallow import ValidationError
+
+import main
+from fast_schema import CompiledSchema
+
+LOAD_CASES = {
+    main.UserCreateSchema: [
+        {"username": "alice", "email": "alice@example.com"},
+        {"username": "alice"},
+        {"username": "alice", "email": "not-an-email"},
+        {"username": 5, "email": "alice@example.com"},
+        {"username": None, "email": "alice@example.com"},
+        {"username": "alice", "email": "alice@example.com", "extra": 1},
+        {},
+        [],
+        "text",
+        None,
+    ],
+    main.UserUpdateSchema: [
+        {"username": "bob"},
+        {"email": "bob@example.com"},
+        {"username": ""},
+        {"username": b"bytes"},
+        {"email": "bad"},
+        {"unknown": True},
+    ],
+    main.BulkUpdateItemSchema: [
+        {"id": 1, "email": "bob@example.com"},
+        {"id": "1", "email": "bob@example.com"},
+        {"id": 0},
+        {"id": True},
+        {"id": 1.5},
+        {"email": "bob@example.com"},
+    ],
+    main.UserListQuerySchema: [
+        {},
+        {"limit": "10"},
+        {"limit": 10, "after": main.encode_cursor(42)},
+        {"after": "garbage"},
+        {"limit": "0", "other": "ignored"},
+    ],
+    main.UserIdSchema: [{"id": "1"}, {"id": 1}, {}],
+    main.BulkDeleteSchema: [{"ids": [1, 2]}, {"filter": {"email": "a@b.c"}}, {}],
+}
+
+DUMP_CASES = {
+    main.MessageResponseSchema: [{"message": "Hello, World!"}, {}, {"message": 5}],
+    main.FrameworkResponseSchema: [{"framework": "flask"}],
+    main.MethodResponseSchema: [{"method": "GET"}],
+    main.UserInfoSchema: [{"name": "张三"}, {"name": None}, {"name": b"bytes"}],
+    main.DeleteResponseSchema: [{"message": "deleted", "id": "7"}],
+    main.UserResponseSchema: [
+        main.User(id=1, username="alice", email="alice@example.com"),
+        main.User(username="nobody", email="nobody@example.com"),
+        {"id": 1, "username": "alice", "email": "alice@example.com"},
+    ],
+}
+
+
+def outcome(function, *args, **kwargs):
+    try:
+        return "ok", function(*args, **kwargs)
+    except ValidationError as err:
+        return "error", err.messages
+
+
+def check_equivalence():
+    failures = 0
+    for schema_class, cases in LOAD_CASES.items():
+        for many in (False, True):
+            schema = schema_class(many=many)
+            fast = CompiledSchema(schema_class(many=many))
+            for case in cases:
+                data = [case, case] if many else case
+                expected = outcome(schema.load, data)
+                actual = outcome(fast.load, data)
+                if expected != actual:
+                    failures += 1
+                    print(f"load mismatch {schema_class.__name__} {data!r}")
+                    print(f"  marshmallow: {expected!r}\n  compiled:    {actual!r}")
+    for schema_class, cases in DUMP_CASES.items():
+        for many in (False, True):
+            schema = schema_class(many=many)
+            fast = CompiledSchema(schema_class(many=many))
+            for case in cases:
+                data = [case, case] if many else case
+                expected = schema.dump(data)
+                actual = fast.dump(data)
+                if expected != actual or (not many and list(expected) != list(actual)):
+                    failures += 1
+                    print(f"dump mismatch {schema_class.__name__} {data!r}")
+                    print(f"  marshmallow: {expected!r}\n  compiled:    {actual!r}")
+    return failures
+
+
+def bench(label, baseline, candidate, number):
+    base = min(timeit.repeat(baseline, number=number, repeat=5)) / number
+    fast = min(timeit.repeat(candidate, number=number, repeat=5)) / number
+    print(
+        f"{label:<40} marshmallow {base * 1e6:10.2f} us"
+        f"   compiled {fast * 1e6:10.2f} us   x{base / fast:5.1f}"
+    )
+
+
+def run_benchmarks():
+    users = [
+        main.User(id=i, username=f"user{i}", email=f"user{i}@example.com")
+        for i in range(1000)
+    ]
+    payload = {"username": "alice", "email": "alice@example.com"}
+    payloads = [
+        {"username": f"user{i}", "email": f"user{i}@example.com"} for i in range(1000)
+    ]
+
+    message = main.MessageResponseSchema()
+    fast_message = CompiledSchema(main.MessageResponseSchema())
+    single = main.UserResponseSchema()
+    fast_single = CompiledSchema(main.UserResponseSchema())
+    many = main.UserResponseSchema(many=True)
+    fast_many = CompiledSchema(main.UserResponseSchema(many=True))
+    create = main.UserCreateSchema()
+    fast_create = CompiledSchema(main.UserCreateSchema())
+    create_many = main.UserCreateSchema(many=True)
+    fast_create_many = CompiledSchema(main.UserCreateSchema(many=True))
+
+    bench(
+        "MessageResponseSchema.dump",
+        lambda: message.dump({"message": "Hello, World!"}),
+        lambda: fast_message.dump({"message": "Hello, World!"}),
+        20000,
+    )
+    bench(
+        "UserResponseSchema.dump",
+        lambda: single.dump(users[0]),
+        lambda: fast_single.dump(users[0]),
+        20000,
+    )
+    bench(
+        "UserResponseSchema(many=True).dump x1000",
+        lambda: many.dump(users),
+        lambda: fast_many.dump(users),
+        20,
+    )
+    bench(
+        "UserCreateSchema.load",
+        lambda: create.load(payload),
+        lambda: fast_create.load(payload),
+        20000,
+    )
+    bench(
+        "UserCreateSchema(many=True).load x1000",
+        lambda: create_many.load(payloads),
+        lambda: fast_create_many.load(payloads),
+        20,
+    )
+
+
+if __name__ == "__main__":
+    failures = check_equivalence()
+    if failures:
+        print(f"{failures} mismatches between compiled schemas and marshmallow")
+        sys.exit(1)
+    print("compiled schemas match marshmallow output and errors")
+    run_benchmarks()
@@ -0,0 +1,124 @@
+"""用户搜索基准：检查查询计划并对比全表扫描
+
+用法: python benchmarks/bench_search.py [--users 100000] [--runs 50]
+
+在临时数据库中写入 --users 个用户（FTS5 索引由触发器同步），对 /api/users/search
+的每种搜索方式输出 EXPLAIN QUERY PLAN 和请求耗时中位数，并与不使用索引的
+LIKE 全表扫描（NOT INDEXED）对比。任何搜索的查询计划出现全表扫描（SCAN user）或为排序建立
+临时 B 树时以非零状态退出。
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main
+from main import User, db
+
+# 名称 -> (查询参数, 等价的全表扫描条件)
+CASES = {
+    "username_prefix": (
+        {"username_prefix": "user0123"},
+        "username LIKE 'user0123%'",
+    ),
+    "email": ({"email": "user01234@example7.com"}, "email = 'user01234@example7.com'"),
+    "email_domain": ({"email_domain": "example7.com"}, "email LIKE '%@example7.com'"),
+    "q": ({"q": "user0123"}, "(username LIKE '%user0123%' OR email LIKE '%user0123%')"),
+}
+
+
+def seed(count):
+    rows = [
+        {
+            "username": f"user{index:05d}",
+            "email": f"user{index:05d}@example{index % 10}.com",
+        }
+        for index in range(count)
+    ]
+    db.session.execute(db.insert(User), rows)
+    db.session.commit()
+    db.session.execute(db.text("ANALYZE"))
+
+
+def query_plan(params):
+    """搜索第一页和后续页（带游标）语句的查询计划"""
+    plans = []
+    for after in (None, "user00000"):
+        statement, order_column, cursor_key = main._search_statement(params)
+        if after is not None:
+            statement = statement.where(
+                order_column > (after if cursor_key == "username" else 1)
+            )
+        sql = (
+            statement.order_by(order_column)
+            .limit(101)
+            .compile(db.engine, compile_kwargs={"literal_binds": True})
+        )
+        rows = db.session.execute(db.text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        plans.append([row[-1] for row in rows])
+    return plans
+
+
+def median_ms(function, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run():
+    parser = argparse.ArgumentParser(description="User search benchmark")
+    parser.add_argument("--users", type=int, default=100000, help="Users to insert")
+    parser.add_argument("--runs", type=int, default=50, help="Requests per case")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = main.create_app(
+            {
+                "DB_PROFILE": "production",
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{Path(directory) / 'bench.db'}",
+            }
+        )
+        main.init_db(app)
+        client = app.test_client()
+        failed = False
+        with app.app_context():
+            seed(args.users)
+            print(f"{args.users} users")
+            for name, (params, condition) in CASES.items():
+                for plan in query_plan(params):
+                    bad = [
+                        step
+                        for step in plan
+                        if step.split()[:2] == ["SCAN", "user"] or "TEMP B-TREE" in step
+                    ]
+                    failed = failed or bool(bad)
+                    print(f"  {name:<16} {'FULL SCAN ' if bad else ''}{plan}")
+
+                def search(params=params):
+                    response = client.get("/api/users/search", query_string=params)
+                    assert response.status_code == 200, response.get_json()
+
+                def scan(condition=condition):
+                    db.session.execute(
+                        db.text(
+                            f"SELECT * FROM user NOT INDEXED WHERE {condition} ORDER BY id"
+                        )
+                    ).all()
+
+                print(
+                    f"  {name:<16} search {median_ms(search, args.runs):8.2f} ms"
+                    f"   full scan query {median_ms(scan, args.runs):8.2f} ms"
+                )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,112 @@
+"""SQLite 性能配置档的读写吞吐基准
+
+用法: python benchmarks/bench_sqlite.py [--threads 8] [--operations 500]
+
+对每个配置档在临时数据库上并发执行写入（每次写入单独提交）和按主键读取，
+输出每秒操作数以及 "database is locked" 错误次数。
+"""
+
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    insert,
+    select,
+)
+from sqlalchemy.exc import OperationalError
+
+from sqlite_profile import PROFILES, register_pragmas
+
+metadata = MetaData()
+users = Table(
+    "user",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("username", String, unique=True, nullable=False),
+    Column("email", String, nullable=False),
+)
+
+
+def create_profile_engine(path, profile):
+    options = dict(profile["config"].get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    # 默认的 pysqlite 连接不允许跨线程，基准中每个线程各自取连接即可
+    engine = create_engine(f"sqlite:///{path}", **options)
+    register_pragmas(engine, profile["pragmas"])
+    return engine
+
+
+def run_workers(count, target):
+    errors = []
+    threads = [
+        threading.Thread(target=target, args=(index, errors)) for index in range(count)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, len(errors)
+
+
+def bench_profile(name, threads, operations):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_profile_engine(Path(directory) / "bench.db", PROFILES[name])
+        metadata.create_all(engine)
+
+        def writer(index, errors):
+            for number in range(operations):
+                try:
+                    with engine.begin() as connection:
+                        connection.execute(
+                            insert(users).values(
+                                username=f"w{index}-{number}",
+                                email=f"w{index}-{number}@example.com",
+                            )
+                        )
+                except OperationalError:
+                    errors.append(1)
+
+        def reader(index, errors):
+            statement = select(users).where(users.c.id == 1)
+            for _ in range(operations * 4):
+                try:
+                    with engine.connect() as connection:
+                        connection.execute(statement).first()
+                except OperationalError:
+                    errors.append(1)
+
+        write_time, write_errors = run_workers(threads, writer)
+        read_time, read_errors = run_workers(threads, reader)
+        engine.dispose()
+
+    writes = threads * operations - write_errors
+    reads = threads * operations * 4 - read_errors
+    print(
+        f"{name:<12} writes {writes / write_time:10.0f}/s ({write_errors} locked)"
+        f"   reads {reads / read_time:10.0f}/s ({read_errors} locked)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite profile benchmark")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--operations", type=int, default=500)
+    args = parser.parse_args()
+    for name in PROFILES:
+        bench_profile(name, args.threads, args.operations)
+
+
+if __name__ == "__main__":
+    main()
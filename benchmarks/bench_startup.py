@@ -0,0 +1,153 @@
+"""启动耗时基准：导入 main、创建应用和处理第一个请求的耗时
+
+用法:
+    python benchmarks/bench_startup.py                 # 测量当前代码
+    python benchmarks/bench_startup.py --ref HEAD~1    # 同时测量某个 git 版本，便于对比
+
+每次测量都启动新的解释器（冷启动），取 --runs 次的中位数。进程总耗时包含解释器
+自身的启动；import/create_app/first request 在进程内计时。最后用
+``python -X importtime`` 列出自身导入耗时最多的模块和导入的模块总数。
+没有 create_app 的旧版本只测量导入（旧版本导入时就会建表）。
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 在子进程中执行，结果以一行JSON输出
+SNIPPET = """
+import json, os, sys, time
+sys.argv = ["main.py"]
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+result = {"import_ms": (imported - started) * 1000}
+if hasattr(main, "create_app"):
+    app = main.create_app(
+        {
+            "DB_PROFILE": "production",
+            "SQLALCHEMY_DATABASE_URI": os.environ["BENCH_DATABASE_URI"],
+        }
+    )
+    created = time.perf_counter()
+    app.test_client().get("/hi")
+    result["create_app_ms"] = (created - imported) * 1000
+    result["first_request_ms"] = (time.perf_counter() - created) * 1000
+print(json.dumps(result))
+"""
+
+STEPS = ("process_ms", "import_ms", "create_app_ms", "first_request_ms")
+
+
+def measure(directory, runs):
+    samples = {step: [] for step in STEPS}
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as database:
+            # 每次使用新的数据库文件，第一个请求从建表开始
+            command = [sys.executable, "-c", SNIPPET]
+            started = time.perf_counter()
+            output = subprocess.run(
+                command,
+                cwd=directory,
+                env=_env(database),
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            elapsed = (time.perf_counter() - started) * 1000
+        result = json.loads(output.strip().splitlines()[-1])
+        result["process_ms"] = elapsed
+        for step, value in result.items():
+            samples[step].append(value)
+    return {
+        step: statistics.median(values) for step, values in samples.items() if values
+    }
+
+
+def import_profile(directory, top):
+    """解析 -X importtime 的输出，返回 main 的累计耗时、模块数和自身耗时最多的模块"""
+    command = [
+        sys.executable,
+        "-X",
+        "importtime",
+        "-c",
+        "import sys; sys.argv = ['main.py']; import main",
+    ]
+    with tempfile.TemporaryDirectory() as database:
+        stderr = subprocess.run(
+            command,
+            cwd=directory,
+            env=_env(database),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        modules.append((int(self_us), int(cumulative_us), name.strip()))
+    total = next((cumulative for _, cumulative, name in modules if name == "main"), 0)
+    return total / 1000, len(modules), sorted(modules, reverse=True)[:top]
+
+
+def _env(directory):
+    env = dict(os.environ)
+    env["BENCH_DATABASE_URI"] = f"sqlite:///{Path(directory) / 'bench.db'}"
+    return env
+
+
+def checkout(ref, directory):
+    """把 git 版本导出到 directory"""
+    archive = subprocess.run(
+        ["git", "archive", "--format=tar", ref],
+        cwd=ROOT,
+        capture_output=True,
+        check=True,
+    ).stdout
+    path = Path(directory) / "source.tar"
+    path.write_bytes(archive)
+    with tarfile.open(path) as tar:
+        tar.extractall(directory, filter="data")
+    return Path(directory)
+
+
+def report(label, directory, args):
+    timings = measure(directory, args.runs)
+    total, count, modules = import_profile(directory, args.top)
+    print(f"== {label}")
+    for step in STEPS:
+        if step in timings:
+            print(f"  {step:<18} {timings[step]:9.1f}")
+    print(f"  importtime main    {total:9.1f} ms, {count} modules imported")
+    for self_us, cumulative_us, name in modules:
+        print(
+            f"    {self_us / 1000:7.1f} ms self {cumulative_us / 1000:8.1f} ms  {name}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time benchmark")
+    parser.add_argument("--runs", type=int, default=10, help="Cold starts per target")
+    parser.add_argument("--top", type=int, default=15, help="Modules to list")
+    parser.add_argument("--ref", help="Also measure this git revision")
+    args = parser.parse_args()
+
+    report("working tree", ROOT, args)
+    if args.ref:
+        with tempfile.TemporaryDirectory() as directory:
+            report(args.ref, checkout(args.ref, directory), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+"""HTTP 接口基准：覆盖 main.py 的全部路由，保存基线并检查性能回退
+
+用法:
+    python benchmarks/http_bench.py                       # 运行并打印结果
+    python benchmarks/http_bench.py --save base.json      # 保存为基线
+    python benchmarks/http_bench.py --compare base.json   # 与基线比较，回退时退出码为1
+
+对每个表大小（--table-sizes）准备一个临时数据库，分别用 Flask 测试客户端
+（进程内，不含网络开销）和真实启动的服务器（--server-mode）在各个并发级别
+（--concurrency）下逐个路由发送 --requests 个请求，统计吞吐量和 p50/p95/p99 延迟。
+吞吐量下降或 p99 延迟上升超过 --threshold（比例）视为回退。
+"""
+
+import argparse
+import base64
+import http.client
+import itertools
+import json
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# (名称, 方法, 路径, 请求体)，路径和请求体可以是接收上下文的函数
+ROUTES = [
+    ("index", "GET", "/", None),
+    ("hi", "GET", "/hi", None),
+    ("hello", "POST", "/hello", None),
+    ("user", "GET", "/user/3", None),
+    ("method", "GET", "/method", None),
+    ("user_info", "GET", "/user-info", None),
+    ("list_users", "GET", "/api/users?limit=100", None),
+    (
+        "list_users_deep",
+        "GET",
+        lambda ctx: f"/api/users?limit=100&after={ctx.cursor()}",
+        None,
+    ),
+    ("list_users_fields", "GET", "/api/users?limit=100&fields=id,username", None),
+    ("get_user", "GET", lambda ctx: f"/api/users/{ctx.existing_id()}", None),
+    ("user_stats", "GET", "/api/users/stats", None),
+    (
+        "search_prefix",
+        "GET",
+        lambda ctx: f"/api/users/search?username_prefix=seed{ctx.existing_id()}",
+        None,
+    ),
+    (
+        "search_text",
+        "GET",
+        lambda ctx: f"/api/users/search?q=seed{ctx.existing_id()}",
+        None,
+    ),
+    (
+        "create_user",
+        "POST",
+        "/api/users",
+        lambda ctx: {"username": f"bench-{uuid.uuid4().hex}", "email": "b@example.com"},
+    ),
+    (
+        "update_user",
+        "PUT",
+        lambda ctx: f"/api/users/{ctx.existing_id()}",
+        lambda ctx: {"email": f"u{random.randint(0, 10**6)}@example.com"},
+    ),
+    (
+        "upsert_user",
+        "PUT",
+        lambda ctx: f"/api/users/by-username/seed{ctx.existing_id()}",
+        lambda ctx: {"email": f"u{random.randint(0, 10**6)}@example.com"},
+    ),
+    ("delete_user", "DELETE", lambda ctx: f"/api/users/{ctx.deletable_id()}", None),
+]
+
+HEADERS = {"Content-Type": "application/json", "Accept": "application/json"}
+
+
+class Context:
+    """生成请求参数：读写使用前 table_size 个用户，删除使用额外预留的用户"""
+
+    def __init__(self, table_size, reserve):
+        self.table_size = table_size
+        self._deletable = iter(range(table_size + 1, table_size + reserve + 1))
+        self._lock = threading.Lock()
+
+    def existing_id(self):
+        return random.randint(1, self.table_size)
+
+    def cursor(self):
+        # 与 main.encode_cursor 相同，从表的中间开始翻页
+        payload = json.dumps({"id": self.table_size // 2}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode("ascii")).decode().rstrip("=")
+
+    def deletable_id(self):
+        with self._lock:
+            return next(self._deletable)
+
+
+def resolve(value, context):
+    return value(context) if callable(value) else value
+
+
+class TestClientTarget:
+    """进程内的 Flask 测试客户端"""
+
+    name = "testclient"
+
+    def __init__(self, database):
+        sys.path.insert(0, str(ROOT))
+        import main
+
+        self.main = main
+        self.app = main.create_app(
+            {
+                "DB_PROFILE": "production",
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{database}",
+            }
+        )
+        self.local = threading.local()
+
+    def reset(self):
+        self.main.init_db(self.app)
+        with self.app.app_context():
+            self.main.db.drop_all()
+            self.main.db.create_all()
+            self.main.user_cache.clear()
+
+    def request(self, method, path, body):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body, headers=HEADERS)
+        response.close()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class ServerTarget:
+    """以子进程启动的 main.py 服务器，每个线程复用一个 keep-alive 连接"""
+
+    def __init__(self, database, mode, workers, threads):
+        self.name = f"server-{mode}"
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        command = [
+            sys.executable,
+            str(ROOT / "main.py"),
+            "--server",
+            mode,
+            "--port",
+            str(self.port),
+            "--db-profile",
+            "production",
+            "--database-uri",
+            f"sqlite:///{database}",
+            "--workers",
+            str(workers),
+            "--threads",
+            str(threads),
+        ]
+        self.process = subprocess.Popen(
+            command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self.local = threading.local()
+        self.connections = []
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                self.request("GET", "/hi", None)
+                break
+            except OSError:
+                if time.monotonic() > deadline or self.process.poll() is not None:
+                    self.close()
+                    raise RuntimeError(f"{self.name} did not start")
+                time.sleep(0.2)
+
+    def reset(self):
+        pass
+
+    def request(self, method, path, body):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+            self.local.connection = connection
+            self.connections.append(connection)
+        payload = None if body is None else json.dumps(body).encode("utf-8")
+        try:
+            connection.request(method, path, body=payload, headers=HEADERS)
+            response = connection.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self.local.connection = None
+            raise
+        return response.status
+
+    def close(self):
+        for connection in self.connections:
+            connection.close()
+        self.process.terminate()
+        self.process.wait(timeout=60)
+
+
+def seed(target, count):
+    """通过批量接口写入测试用户，ID 为 1..count"""
+    batch = 5000
+    for start in range(0, count, batch):
+        items = [
+            {"username": f"seed{i}", "email": f"seed{i}@example.com"}
+            for i in range(start, min(start + batch, count))
+        ]
+        status = target.request("POST", "/api/users/bulk", items)
+        if status != 201:
+            raise RuntimeError(f"seeding failed with status {status}")
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_route(target, route, context, concurrency, requests):
+    _name, method, path, body = route
+    latencies = []
+    errors = 0
+
+    def worker(count):
+        local = []
+        failed = 0
+        for _ in range(count):
+            request_path = resolve(path, context)
+            request_body = resolve(body, context)
+            started = time.perf_counter()
+            try:
+                status = target.request(method, request_path, request_body)
+            except (http.client.HTTPException, OSError):
+                status = None
+            elapsed = time.perf_counter() - started
+            if status is None or status >= 400:
+                failed += 1
+            else:
+                local.append(elapsed)
+        return local, failed
+
+    shares = [requests // concurrency] * concurrency
+    for index in range(requests % concurrency):
+        shares[index] += 1
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for local, failed in executor.map(worker, shares):
+            latencies.extend(local)
+            errors += failed
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    if not latencies:
+        return {"requests": requests, "errors": errors, "throughput": 0.0}
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def run_target(target, table_size, args, routes, results):
+    reserve = args.requests * len(args.concurrency)
+    target.reset()
+    seed(target, table_size + reserve)
+    context = Context(table_size, reserve)
+    for concurrency in args.concurrency:
+        for route in routes:
+            result = run_route(target, route, context, concurrency, args.requests)
+            key = f"{target.name}/{table_size}/c{concurrency}/{route[0]}"
+            results[key] = result
+            print(format_result(key, result), flush=True)
+
+
+def format_result(key, result):
+    if "p50_ms" not in result:
+        return f"{key:<48} all {result['errors']} requests failed"
+    return (
+        f"{key:<48} {result['throughput']:9.0f} req/s"
+        f"  p50 {result['p50_ms']:7.2f}  p95 {result['p95_ms']:7.2f}"
+        f"  p99 {result['p99_ms']:7.2f} ms  {result['errors']} errors"
+    )
+
+
+def compare(results, baseline, threshold):
+    """返回回退的条目列表"""
+    regressions = []
+    for key, result in results.items():
+        previous = baseline.get(key)
+        if previous is None or "p99_ms" not in previous:
+            continue
+        if result.get("throughput", 0) < previous["throughput"] * (1 - threshold):
+            regressions.append(
+                f"{key}: throughput {previous['throughput']:.0f} -> "
+                f"{result['throughput']:.0f} req/s"
+            )
+        if "p99_ms" not in result or result["p99_ms"] > previous["p99_ms"] * (
+            1 + threshold
+        ):
+            regressions.append(
+                f"{key}: p99 {previous['p99_ms']:.2f} -> "
+                f"{result.get('p99_ms', float('inf')):.2f} ms"
+            )
+        if result["errors"] > previous["errors"]:
+            regressions.append(
+                f"{key}: errors {previous['errors']} -> {result['errors']}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP benchmark suite")
+    parser.add_argument(
+        "--targets",
+        nargs="+",
+        choices=["testclient", "server"],
+        default=["testclient", "server"],
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--table-sizes", type=int, nargs="+", default=[100, 10000])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per route")
+    parser.add_argument(
+        "--routes", nargs="+", help="Only run these routes (default: all)"
+    )
+    parser.add_argument(
+        "--server-mode", choices=["dev", "production", "async"], default="production"
+    )
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--save", type=Path, help="Write results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="Baseline JSON to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Allowed relative regression in throughput and p99 latency",
+    )
+    args = parser.parse_args()
+
+    routes = [route for route in ROUTES if not args.routes or route[0] in args.routes]
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        counter = itertools.count()
+        client = None
+        if "testclient" in args.targets:
+            client = TestClientTarget(Path(directory) / "testclient.db")
+        for table_size in args.table_sizes:
+            if client is not None:
+                run_target(client, table_size, args, routes, results)
+            if "server" in args.targets:
+                database = Path(directory) / f"server{next(counter)}.db"
+                server = ServerTarget(
+                    database, args.server_mode, args.workers, args.threads
+                )
+                try:
+                    run_target(server, table_size, args, routes, results)
+                finally:
+                    server.close()
+
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+            file.write("\n")
+        print(f"saved {len(results)} results to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions (threshold {args.threshold:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"no regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""响应压缩
+
+在 after_request 钩子中按 Accept-Encoding 协商压缩算法：gzip、deflate 总是可用，
+br（brotli）和 zstd（zstandard）在安装了对应模块时启用。普通响应整体压缩，
+小于 COMPRESS_MIN_SIZE 的不压缩；流式响应（生成器）逐块压缩并在每块后刷新，
+客户端仍能及时收到数据。只压缩 COMPRESS_MIMETYPES 中的文本类类型，
+图片、压缩包等已压缩的内容以及已设置 Content-Encoding 的响应原样返回。
+"""
+
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard 为可选依赖
+    zstandard = None
+
+DEFAULT_MIMETYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/css",
+    "text/csv",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+    "text/xml",
+)
+
+
+class _ZlibCompressor:
+    def __init__(self, level, wbits):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliCompressor:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class _ZstdCompressor:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+# 算法名到压缩器工厂的映射，gzip 和 deflate 分别是带 gzip 头和 zlib 头的 DEFLATE
+COMPRESSORS = {
+    "gzip": lambda level: _ZlibCompressor(level, 16 + zlib.MAX_WBITS),
+    "deflate": lambda level: _ZlibCompressor(level, zlib.MAX_WBITS),
+}
+if brotli is not None:
+    COMPRESSORS["br"] = _BrotliCompressor
+if zstandard is not None:
+    COMPRESSORS["zstd"] = _ZstdCompressor
+
+
+class Compress:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("COMPRESS_ALGORITHMS", ["br", "zstd", "gzip", "deflate"])
+        app.config.setdefault(
+            "COMPRESS_LEVELS", {"br": 4, "zstd": 3, "gzip": 6, "deflate": 6}
+        )
+        app.config.setdefault("COMPRESS_MIN_SIZE", 500)
+        app.config.setdefault("COMPRESS_MIMETYPES", DEFAULT_MIMETYPES)
+        self.app = app
+        app.extensions["compress"] = self
+        app.after_request(self.after_request)
+
+    def after_request(self, response):
+        config = self.app.config
+        if (
+            response.status_code < 200
+            or response.status_code in (204, 206, 304)
+            or request.method == "HEAD"
+            or response.direct_passthrough  # send_file 等文件响应
+            or "Content-Encoding" in response.headers
+            or "no-transform" in response.headers.get("Cache-Control", "")
+            or response.mimetype not in config["COMPRESS_MIMETYPES"]
+        ):
+            return response
+
+        streamed = response.is_streamed
+        if not streamed:
+            data = response.get_data()
+            if len(data) < config["COMPRESS_MIN_SIZE"]:
+                return response
+
+        # 可能压缩的响应都要声明 Vary，避免缓存把压缩版本返回给不支持的客户端
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(
+            [name for name in config["COMPRESS_ALGORITHMS"] if name in COMPRESSORS]
+        )
+        if encoding is None:
+            return response
+        level = config["COMPRESS_LEVELS"][encoding]
+
+        if streamed:
+            response.response = _compress_stream(
+                response.response, COMPRESSORS[encoding](level)
+            )
+            response.headers.pop("Content-Length", None)
+        else:
+            compressor = COMPRESSORS[encoding](level)
+            compressed = compressor.compress(data) + compressor.finish()
+            if len(compressed) >= len(data):
+                return response
+            response.set_data(compressed)
+
+        response.headers["Content-Encoding"] = encoding
+        # 压缩后的字节与原表示不同，强ETag改为弱ETag
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+def _compress_stream(chunks, compressor):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        # 原始可迭代对象（如 stream_with_context）需要关闭以释放请求上下文
+        if hasattr(chunks, "close"):
+            chunks.close()
@@ -0,0 +1,203 @@
+"""marshmallow Schema 编译层
+
+把 Schema 编译成专用的 dump/load 函数并缓存，输出和错误信息与 marshmallow
+完全一致：load 快速路径只处理能确定结果的输入，遇到任何校验失败或不支持的
+情况都交回 ``Schema.load``，由 marshmallow 生成原样的错误信息。
+"""
+
+import functools
+from collections.abc import Mapping
+
+from marshmallow import EXCLUDE, RAISE, Schema, ValidationError, fields, missing
+from marshmallow.utils import get_value
+
+DUMP_HOOKS = {"pre_dump", "post_dump"}
+
+
+class _Fallback(Exception):
+    """快速路径无法处理当前输入，交给 marshmallow"""
+
+
+def _text(value):
+    # 与 marshmallow.utils.ensure_text_type 一致
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return str(value)
+
+
+def _is_plain(field, *field_classes):
+    return (
+        type(field) in field_classes
+        and not getattr(field, "as_string", False)
+        and not field.pre_load
+        and not field.post_load
+    )
+
+
+def _compile(name, lines, namespace):
+    source = "\n".join(lines)
+    code = compile(source, f"<compiled {name}>", "exec")
+    exec(code, namespace)
+    return namespace[name.split(".")[-1]]
+
+
+class CompiledSchema:
+    """已编译的 Schema，提供与 ``Schema.dump`` / ``Schema.load`` 相同的接口"""
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.many = schema.many
+        self._dump_one = self._compile_dump()
+        self._load_one = self._compile_load()
+
+    def dump(self, obj, *, many=None):
+        many = self.many if many is None else many
+        dump_one = self._dump_one
+        if dump_one is None:
+            return self.schema.dump(obj, many=many)
+        if many:
+            return [dump_one(item) for item in obj]
+        return dump_one(obj)
+
+    def load(self, data, *, many=None):
+        many = self.many if many is None else many
+        load_one = self._load_one
+        if load_one is not None:
+            try:
+                if not many:
+                    return load_one(data)
+                if isinstance(data, list):
+                    return [load_one(item) for item in data]
+            except (_Fallback, ValidationError):
+                pass
+        return self.schema.load(data, many=many)
+
+    def _compile_dump(self):
+        schema = self.schema
+        if DUMP_HOOKS & {tag for tag, hooks in schema._hooks.items() if hooks}:
+            return None
+        if type(schema).get_attribute is not Schema.get_attribute:
+            return None
+
+        namespace = {
+            "missing": missing,
+            "get_value": get_value,
+            "text": _text,
+            "accessor": schema.get_attribute,
+        }
+        getters = {"dict": [], "object": [], "generic": []}
+        body = ["    result = {}"]
+        for index, (name, field) in enumerate(schema.dump_fields.items()):
+            key = field.data_key if field.data_key is not None else name
+            attribute = field.attribute or name
+            value = f"v{index}"
+            plain = (
+                field.dump_default is missing
+                and "." not in attribute
+                and (
+                    _is_plain(field, fields.Integer)
+                    or _is_plain(field, fields.String, fields.Email)
+                )
+            )
+            if not plain:
+                # 其他字段类型直接调用字段自身的序列化逻辑
+                namespace[f"field{index}"] = field
+                body.append(
+                    f"    {value} = field{index}.serialize({name!r}, obj, "
+                    "accessor=accessor)"
+                )
+                body.append(f"    if {value} is not missing:")
+                body.append(f"        result[{key!r}] = {value}")
+                continue
+
+            getters["dict"].append(
+                f"{value} = obj[{attribute!r}] if {attribute!r} in obj "
+                f"else getattr(obj, {attribute!r}, missing)"
+            )
+            getters["object"].append(f"{value} = getattr(obj, {attribute!r}, missing)")
+            getters["generic"].append(f"{value} = get_value(obj, {attribute!r})")
+            if isinstance(field, fields.Integer):
+                converted = f"int({value})"
+            else:
+                converted = f"{value} if type({value}) is str else text({value})"
+            body.append(f"    if {value} is not missing:")
+            body.append(
+                f"        result[{key!r}] = None if {value} is None else {converted}"
+            )
+
+        lines = ["def dump(obj):", "    cls = type(obj)"]
+        branches = [
+            ("if cls is dict:", getters["dict"]),
+            ("elif not hasattr(cls, '__getitem__'):", getters["object"]),
+            ("else:", getters["generic"]),
+        ]
+        if getters["dict"]:
+            for condition, statements in branches:
+                lines.append(f"    {condition}")
+                lines.extend(f"        {statement}" for statement in statements)
+        lines.extend(body)
+        lines.append("    return result")
+        return _compile(f"{type(schema).__name__}.dump", lines, namespace)
+
+    def _compile_load(self):
+        schema = self.schema
+        if any(schema._hooks.values()) or schema.partial:
+            return None
+        if schema.unknown not in (RAISE, EXCLUDE):
+            return None
+
+        namespace = {"missing": missing, "Mapping": Mapping, "Fallback": _Fallback}
+        lines = [
+            "def load(data):",
+            "    if not isinstance(data, Mapping):",
+            "        raise Fallback",
+        ]
+        if schema.unknown == RAISE:
+            namespace["known"] = frozenset(
+                field.data_key if field.data_key is not None else name
+                for name, field in schema.load_fields.items()
+            )
+            lines.append("    if not known.issuperset(data):")
+            lines.append("        raise Fallback")
+        lines.append("    result = {}")
+
+        for index, (name, field) in enumerate(schema.load_fields.items()):
+            if isinstance(field, fields.Nested) or "." in (field.attribute or name):
+                return None
+            key = field.data_key if field.data_key is not None else name
+            attribute = field.attribute or name
+            value = f"v{index}"
+            namespace[f"field{index}"] = field
+            namespace[f"validators{index}"] = tuple(field.validators)
+
+            lines.append(f"    if {key!r} in data:")
+            lines.append(f"        {value} = data[{key!r}]")
+            if _is_plain(field, fields.Integer) or _is_plain(
+                field, fields.String, fields.Email
+            ):
+                expected = "int" if isinstance(field, fields.Integer) else "str"
+                lines.append(f"        if type({value}) is not {expected}:")
+                lines.append("            raise Fallback")
+                lines.append(f"        for validator in validators{index}:")
+                lines.append(f"            validator({value})")
+            else:
+                lines.append(
+                    f"        {value} = field{index}.deserialize({value}, {key!r}, data)"
+                )
+            lines.append(f"        result[{attribute!r}] = {value}")
+            if field.required:
+                lines.append("    else:")
+                lines.append("        raise Fallback")
+            elif field.load_default is not missing:
+                lines.append("    else:")
+                lines.append(
+                    f"        result[{attribute!r}] = field{index}.deserialize(missing)"
+                )
+        lines.append("    return result")
+        return _compile(f"{type(schema).__name__}.load", lines, namespace)
+
+
+@functools.cache
+def compiled(schema_class, many=False):
+    """返回缓存的已编译 Schema，每个 Schema 类只编译一次"""
+    return CompiledSchema(schema_class(many=many))
@@ -1,43 +1,514 @@
+import argparse
+import fnmatch
+import hashlib
+import importlib
+import json
+import os
+import runpy
+import select
+import signal
+import socket
 import subprocess
 import sys
+import threading
 import time
+import traceback
 
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers import Observer
 
+# 默认只关心 Python 文件，忽略虚拟环境、版本库和缓存目录
+DEFAULT_INCLUDE = ("*.py",)
+DEFAULT_EXCLUDE = (".venv", "venv", ".git", "__pycache__")
+# 会影响文件内容的事件类型（watchdog 新版本还有 opened/closed 等事件）
+CHANGE_EVENTS = ("created", "modified", "moved", "deleted")
+# restart：先停旧进程再启动新进程；bluegreen：新进程就绪后再停旧进程
+RELOAD_MODES = ("restart", "bluegreen")
+# fork server 预先导入的第三方依赖，项目自身的模块在每个子进程里重新导入
+DEFAULT_PRELOAD = (
+    "flask",
+    "flask_marshmallow",
+    "flask_sqlalchemy",
+    "flask_swagger_ui",
+    "gzip",
+    "marshmallow",
+    "marshmallow_sqlalchemy",
+    "orjson",
+    "sqlalchemy.dialects.sqlite",
+    "sqlalchemy.orm",
+    "sqlite3",
+    "werkzeug.serving",
+)
+
+
+def file_digest(path):
+    """文件内容的哈希，文件不存在或不可读时返回 None"""
+    try:
+        with open(path, "rb") as file:
+            return hashlib.sha1(file.read()).hexdigest()
+    except OSError:
+        return None
+
 
 class FileChangeHandler(FileSystemEventHandler):
-    def __init__(self, script_path):
+    """合并一段时间内的文件事件，内容确实变化时只重启一次
+
+    每个事件都会把重启推迟 debounce 秒，编辑器保存或 git checkout
+    产生的一连串事件在安静下来后统一处理；内容哈希没有变化的保存被忽略。
+
+    bluegreen 模式下由监控器创建监听套接字，通过环境变量 LISTEN_FD 传给子进程，
+    端口在重载过程中始终可以连接：新进程通过 READY_FD 管道报告就绪后，
+    旧进程才收到 SIGTERM，处理完在途请求后退出。新进程启动失败时旧进程继续服务。
+
+    fork_server 为真时脚本不再由新的解释器启动，而是从预先导入了 Flask、
+    SQLAlchemy 等依赖的 ForkServer 进程 fork 出来，只需重新导入项目自身的模块。
+    """
+
+    def __init__(
+        self,
+        script_path,
+        root=".",
+        debounce=0.3,
+        include=DEFAULT_INCLUDE,
+        exclude=DEFAULT_EXCLUDE,
+        script_args=(),
+        reload="restart",
+        port=1999,
+        ready_timeout=60.0,
+        # 比 server.PreforkServer 自己的 30 秒多留余量，让它先结束工作进程
+        graceful_timeout=35.0,
+        fork_server=False,
+        preload=DEFAULT_PRELOAD,
+    ):
         self.script_path = script_path
+        self.root = os.path.abspath(root)
+        self.debounce = debounce
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+        self.script_args = list(script_args)
+        self.reload = reload
+        self.ready_timeout = ready_timeout
+        self.graceful_timeout = graceful_timeout
+        self.socket = None
+        if reload == "bluegreen" and os.name != "posix":
+            # 传递套接字描述符（pass_fds）和 select 管道都只支持 POSIX
+            print("当前平台不支持蓝绿重载，改用 restart 模式")
+            reload = self.reload = "restart"
+        if reload == "bluegreen":
+            self.socket = create_listen_socket(port)
+            self.script_args += ["--port", str(port)]
+        self.fork_server = None
+        if fork_server and not hasattr(os, "fork"):
+            print("当前平台不支持 fork，每次重启都启动新的解释器")
+        elif fork_server:
+            self.fork_server = ForkServer(preload)
         self.process = None
+        self._lock = threading.Lock()  # 保护待处理路径和定时器
+        self._process_lock = threading.RLock()  # 串行化哈希比较和重启
+        self._pending = set()
+        self._timer = None
+        self._draining = []  # 等待旧进程退出的线程
+        self._stopped = False
+        self.hashes = self.snapshot()
         self.restart_script()
 
+    def matches(self, path):
+        """按 include/exclude 规则判断是否关心这个路径"""
+        relative = os.path.relpath(os.path.abspath(path), self.root)
+        parts = relative.split(os.sep)
+        for pattern in self.exclude:
+            if fnmatch.fnmatch(relative, pattern) or any(
+                fnmatch.fnmatch(part, pattern) for part in parts
+            ):
+                return False
+        return any(
+            fnmatch.fnmatch(relative, pattern) or fnmatch.fnmatch(parts[-1], pattern)
+            for pattern in self.include
+        )
+
+    def snapshot(self):
+        """记录当前所有被监控文件的内容哈希"""
+        hashes = {}
+        for directory, dirnames, filenames in os.walk(self.root):
+            # 被排除的目录不再向下遍历
+            dirnames[:] = [
+                name
+                for name in dirnames
+                if not any(fnmatch.fnmatch(name, pattern) for pattern in self.exclude)
+            ]
+            for name in filenames:
+                path = os.path.join(directory, name)
+                if self.matches(path):
+                    hashes[path] = file_digest(path)
+        return hashes
+
     def restart_script(self):
         """重启Python脚本"""
-        if self.process:
-            print("终止现有进程...")
-            self.process.terminate()
-            self.process.wait()
+        with self._process_lock:
+            if self.socket is not None:
+                self.replace_script()
+                return
+            if self.process:
+                print("终止现有进程...")
+                self.process.terminate()
+                self.process.wait()
+
+            print(f"启动脚本: {self.script_path}")
+            self.process = self.launch()
+
+    def launch(self, fds=None):
+        """启动脚本；fds 中的文件描述符以同名环境变量传给子进程"""
+        fds = fds or {}
+        argv = [self.script_path, *self.script_args]
+        if self.fork_server is not None:
+            return self.fork_server.spawn(argv, fds)
+        env = dict(os.environ, **{name: str(fd) for name, fd in fds.items()})
+        return subprocess.Popen(
+            [sys.executable, *argv], env=env, pass_fds=tuple(fds.values())
+        )
 
+    def replace_script(self):
+        """蓝绿重载：新进程就绪后再让旧进程处理完在途请求退出"""
         print(f"启动脚本: {self.script_path}")
-        self.process = subprocess.Popen([sys.executable, self.script_path])
+        read_fd, write_fd = os.pipe()
+        try:
+            process = self.launch(
+                {"LISTEN_FD": self.socket.fileno(), "READY_FD": write_fd}
+            )
+        finally:
+            os.close(write_fd)
+        try:
+            ready = wait_ready(read_fd, self.ready_timeout)
+        finally:
+            os.close(read_fd)
+        if not ready:
+            print("新进程未能就绪，继续使用现有进程")
+            stop_process(process, self.graceful_timeout)
+            return
 
-    def on_modified(self, event):
-        """当文件被修改时调用"""
-        if event.src_path.endswith(".py"):
-            print(f"检测到文件变化: {event.src_path}")
+        old, self.process = self.process, process
+        if old is not None:
+            print("新进程已就绪，等待旧进程处理完在途请求...")
+            # 在后台等待旧进程退出，不耽误下一次重载
+            thread = threading.Thread(
+                target=stop_process, args=(old, self.graceful_timeout), daemon=True
+            )
+            thread.start()
+            self._draining.append(thread)
+
+    def stop(self):
+        """取消待处理的重启并终止子进程"""
+        with self._lock:
+            self._stopped = True
+            if self._timer is not None:
+                self._timer.cancel()
+        with self._process_lock:
+            if self.process:
+                stop_process(self.process, self.graceful_timeout)
+            for thread in self._draining:
+                thread.join()
+            if self.socket is not None:
+                self.socket.close()
+            if self.fork_server is not None:
+                self.fork_server.close()
+
+    def on_any_event(self, event):
+        """文件被创建、修改、移动或删除时调用"""
+        if event.is_directory or event.event_type not in CHANGE_EVENTS:
+            return
+        # 移动事件的源路径和目标路径都可能是被监控的文件（编辑器的原子保存）
+        paths = [event.src_path, getattr(event, "dest_path", "")]
+        paths = [os.path.abspath(path) for path in paths if path and self.matches(path)]
+        if not paths:
+            return
+        with self._lock:
+            self._pending.update(paths)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """防抖时间结束后比较内容哈希，有变化时重启"""
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            self._timer = None
+        with self._process_lock:
+            if self._stopped:  # 已经在退出，不再启动新进程
+                return
+            changed = []
+            for path in sorted(pending):
+                digest = file_digest(path)
+                if digest != self.hashes.get(path):
+                    changed.append(path)
+                if digest is None:
+                    self.hashes.pop(path, None)
+                else:
+                    self.hashes[path] = digest
+            if not changed:
+                return
+            for path in changed:
+                print(f"检测到文件变化: {os.path.relpath(path, self.root)}")
             self.restart_script()
 
 
+def create_listen_socket(port, host="0.0.0.0"):
+    """由监控器持有的监听套接字，在子进程之间传递，重载期间端口不会关闭"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(socket.SOMAXCONN)
+    return sock
+
+
+def wait_ready(fd, timeout):
+    """等待子进程写入 READY_FD 管道；子进程退出（管道关闭）或超时返回 False"""
+    readable, _, _ = select.select([fd], [], [], timeout)
+    return bool(readable) and os.read(fd, 64).startswith(b"ready")
+
+
+def stop_process(process, timeout):
+    """发送 SIGTERM，超时后强制结束"""
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+class ForkServer:
+    """预先导入依赖的常驻进程，按监控器的请求 fork 出运行脚本的子进程
+
+    监控器自己有 watchdog 和定时器线程，在多线程进程里 fork 可能继承被其它线程
+    持有的锁，所以由单线程的 ForkServer 进程负责 fork。双方通过 Unix 套接字
+    一问一答地交换一行 JSON，要交给子进程的文件描述符随 SCM_RIGHTS 一起发送。
+    """
+
+    def __init__(self, preload=DEFAULT_PRELOAD):
+        self.control, child = socket.socketpair()
+        command = [sys.executable, os.path.abspath(__file__)]
+        command += ["--serve-forks", str(child.fileno())]
+        for name in preload:
+            command += ["--preload", name]
+        try:
+            self.process = subprocess.Popen(command, pass_fds=(child.fileno(),))
+        finally:
+            child.close()
+        self._replies = self.control.makefile("rb")
+        self._lock = threading.Lock()  # 排水线程和重载线程会同时发请求
+
+    def request(self, message, fds=()):
+        data = json.dumps(message).encode() + b"\n"
+        with self._lock:
+            socket.send_fds(self.control, [data], list(fds))
+            reply = self._replies.readline()
+        if not reply:
+            raise RuntimeError("fork server 已退出")
+        return json.loads(reply)
+
+    def spawn(self, argv, fds):
+        """fork 子进程运行 argv 指定的脚本，fds 以同名环境变量传给子进程"""
+        reply = self.request({"spawn": argv, "fds": list(fds)}, fds.values())
+        return ForkedProcess(self, reply["pid"], argv)
+
+    def close(self):
+        """关闭控制套接字，ForkServer 读到 EOF 后退出"""
+        self._replies.close()
+        self.control.close()
+        self.process.wait()
+
+
+class ForkedProcess:
+    """ForkServer fork 出的子进程，提供与 subprocess.Popen 相同的等待和信号接口
+
+    子进程的父进程是 ForkServer，等待和发送信号都通过控制套接字转交给它。
+    """
+
+    def __init__(self, server, pid, args):
+        self.server = server
+        self.pid = pid
+        self.args = args
+        self.returncode = None
+
+    def poll(self):
+        if self.returncode is None:
+            self.returncode = self.server.request({"poll": self.pid})["returncode"]
+        return self.returncode
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(self.args, timeout)
+            time.sleep(0.01)
+        return self.returncode
+
+    def send_signal(self, signum):
+        if self.returncode is None:
+            self.server.request({"signal": int(signum), "pid": self.pid})
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+def serve_forks(control_fd, preload):
+    """ForkServer 进程的主循环：导入依赖后按请求 fork、转发信号和回收子进程"""
+    # Ctrl+C 由监控器处理，子进程恢复原来的处理方式
+    interrupt = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    started = time.perf_counter()
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except ImportError as error:
+            print(f"预先导入 {name} 失败: {error}")
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"fork server 已导入 {len(sys.modules)} 个模块，耗时 {elapsed:.0f} ms")
+    control = socket.socket(fileno=control_fd)
+    while True:
+        data, fds, _, _ = socket.recv_fds(control, 65536, 16)
+        while data and not data.endswith(b"\n"):
+            chunk = control.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+        if not data:  # 监控器已退出
+            return
+        message = json.loads(data)
+        if "spawn" in message:
+            # 避免子进程重复输出 fork 前缓冲区里的内容
+            sys.stdout.flush()
+            sys.stderr.flush()
+            pid = os.fork()
+            if pid == 0:
+                control.close()
+                signal.signal(signal.SIGINT, interrupt)
+                os.environ.update(zip(message["fds"], map(str, fds)))
+                os._exit(run_script(message["spawn"]))
+            reply = {"pid": pid}
+        elif "signal" in message:
+            try:
+                os.kill(message["pid"], message["signal"])
+            except ProcessLookupError:
+                pass
+            reply = {}
+        else:
+            reply = {"returncode": poll_child(message["poll"])}
+        for fd in fds:
+            os.close(fd)
+        control.sendall(json.dumps(reply).encode() + b"\n")
+
+
+def poll_child(pid):
+    """子进程仍在运行时返回 None，否则回收它并返回退出码"""
+    try:
+        pid, status = os.waitpid(pid, os.WNOHANG)
+    except ChildProcessError:
+        return -1
+    return None if pid == 0 else os.waitstatus_to_exitcode(status)
+
+
+def run_script(argv):
+    """在 fork 出的子进程中以 __main__ 运行脚本，返回退出码"""
+    sys.argv = list(argv)
+    # 与 python script.py 一样，脚本所在目录排在 sys.path 最前面
+    sys.path[0] = os.path.dirname(os.path.abspath(argv[0]))
+    code = 0
+    try:
+        runpy.run_path(argv[0], run_name="__main__")
+    except SystemExit as error:
+        if isinstance(error.code, int):
+            code = error.code
+        elif error.code is not None:
+            print(error.code, file=sys.stderr)
+            code = 1
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    return code
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Restart a script on file changes")
+    parser.add_argument("--script", default="main.py", help="Script to run")
+    parser.add_argument("--path", default=".", help="Directory to watch")
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.3,
+        help="Seconds without further events before restarting",
+    )
+    parser.add_argument(
+        "--include",
+        action="append",
+        help=f"Glob of files to watch, repeatable (default: {' '.join(DEFAULT_INCLUDE)})",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        help="Glob of files or directories to ignore, repeatable "
+        f"(default: {' '.join(DEFAULT_EXCLUDE)})",
+    )
+    parser.add_argument(
+        "--reload",
+        choices=RELOAD_MODES,
+        default="restart",
+        help="restart: stop the old process, then start a new one; bluegreen: keep "
+        "the port open and stop the old process only after the new one is ready",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=1999,
+        help="Port the watcher listens on and hands to the script in bluegreen mode",
+    )
+    parser.add_argument(
+        "--fork-server",
+        action="store_true",
+        help="Fork restarts from a process that has already imported the "
+        "dependencies instead of starting a new interpreter",
+    )
+    parser.add_argument(
+        "--preload",
+        action="append",
+        help="Module the fork server imports once, repeatable "
+        f"(default: {' '.join(DEFAULT_PRELOAD)})",
+    )
+    # ForkServer 进程内部使用
+    parser.add_argument("--serve-forks", type=int, help=argparse.SUPPRESS)
+    parser.add_argument(
+        "script_args", nargs="*", help="Arguments passed to the script (after --)"
+    )
+    args = parser.parse_args()
+    if args.serve_forks is not None:
+        serve_forks(args.serve_forks, args.preload or DEFAULT_PRELOAD)
+        return
+
     # 要监控的脚本路径
-    script_to_watch = "main.py"
+    script_to_watch = args.script
 
     # 要监控的目录（当前目录）
-    path_to_watch = "."
+    path_to_watch = args.path
 
     # 创建事件处理器
-    event_handler = FileChangeHandler(script_to_watch)
+    event_handler = FileChangeHandler(
+        script_to_watch,
+        root=path_to_watch,
+        debounce=args.debounce,
+        include=args.include or DEFAULT_INCLUDE,
+        exclude=args.exclude or DEFAULT_EXCLUDE,
+        script_args=args.script_args,
+        reload=args.reload,
+        port=args.port,
+        fork_server=args.fork_server,
+        preload=args.preload or DEFAULT_PRELOAD,
+    )
 
     # 创建观察者
     observer = Observer()
@@ -58,9 +529,7 @@ def main():
     observer.join()
 
     # 清理进程
-    if event_handler.process:
-        event_handler.process.terminate()
-        event_handler.process.wait()
+    event_handler.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,93 @@
+"""可替换的 JSON 编码器
+
+JSON_PROVIDER 配置：
+- ``auto``（默认）：安装了 orjson 时使用，否则使用标准库
+- ``orjson``：使用 orjson，未安装时记录警告日志并回退到标准库
+- ``stdlib``：Flask 默认的标准库编码器
+
+orjson 编码器的输出与 Flask 默认编码器逐字节一致（键排序、紧凑分隔符、
+ensure_ascii 转义、日期格式）。orjson 无法给出相同结果时（非 ASCII 字符、
+非字符串键、超出 64 位的整数、负指数浮点数、NaN/Infinity、缩进输出等）回退到标准库。
+"""
+
+import math
+import re
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖
+    orjson = None
+
+COMPACT_SEPARATORS = (",", ":")
+# 标准库把 1e-07 写成两位指数，orjson 写成 1e-7
+NEGATIVE_EXPONENT = re.compile(rb"[0-9]e-[0-9]")
+JSON_SCALARS = (str, int, type(None))
+
+
+def _may_contain_non_finite(obj):
+    """obj 中是否可能有 NaN/Infinity；交给 default 转换的对象无法检查，按可能处理"""
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_may_contain_non_finite(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_may_contain_non_finite(value) for value in obj)
+    return not isinstance(obj, JSON_SCALARS)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    def _fast_dumps(self, obj):
+        """用 orjson 编码，结果可能与标准库不同时返回 None"""
+        # 日期交给 default 处理，保持 Flask 的 HTTP 日期格式
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            data = orjson.dumps(obj, default=self.default, option=option)
+        except TypeError:  # orjson.JSONEncodeError 是 TypeError 的子类
+            return None
+        # ensure_ascii 会把非 ASCII 字符和 DEL(0x7f) 转义为 \\uXXXX
+        if self.ensure_ascii and (not data.isascii() or b"\x7f" in data):
+            return None
+        if b"e-" in data and NEGATIVE_EXPONENT.search(data):
+            return None
+        # orjson 把 NaN/Infinity 编码为 null，标准库编码为 NaN/Infinity；
+        # 只有输出中有 null 时才需要检查
+        if b"null" in data and _may_contain_non_finite(obj):
+            return None
+        return data
+
+    def dumps(self, obj, **kwargs):
+        if kwargs == {"separators": COMPACT_SEPARATORS}:
+            data = self._fast_dumps(obj)
+            if data is not None:
+                return data.decode("utf-8")
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self.compact or (self.compact is None and not self._app.debug):
+            data = self._fast_dumps(obj)
+            if data is not None:
+                return self._app.response_class(data + b"\n", mimetype=self.mimetype)
+        return super().response(obj)
+
+
+JSON_PROVIDERS = {"stdlib": DefaultJSONProvider, "orjson": OrjsonProvider}
+
+
+def create_json_provider(app):
+    """按 JSON_PROVIDER 配置创建编码器"""
+    name = app.config.get("JSON_PROVIDER", "auto")
+    if name == "auto":
+        name = "stdlib" if orjson is None else "orjson"
+    elif name == "orjson" and orjson is None:
+        app.logger.warning("未安装 orjson，使用标准库 JSON 编码器")
+        name = "stdlib"
+    try:
+        provider_class = JSON_PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown JSON provider: {name}")
+    return provider_class(app)
@@ -1,14 +1,57 @@
 import argparse
+import base64
+import binascii
+import functools
+import hashlib
 import json
-
-from flask import Flask, jsonify, request
+import os
+import threading
+from datetime import datetime, timezone
+
+from flask import (
+    Blueprint,
+    Flask,
+    Response,
+    abort,
+    current_app,
+    jsonify,
+    request,
+    stream_with_context,
+    url_for,
+)
 from flask_marshmallow import Marshmallow
 from flask_sqlalchemy import SQLAlchemy
-from flask_swagger_ui import get_swaggerui_blueprint
-from marshmallow import Schema, fields, validates, ValidationError
+from marshmallow import (
+    EXCLUDE,
+    Schema,
+    ValidationError,
+    fields,
+    validate,
+    validates,
+    validates_schema,
+)
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
+from sqlalchemy import Computed, event, literal_column
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.schema import CreateTable
+from werkzeug.exceptions import HTTPException
+from werkzeug.local import LocalProxy
+
+import fast_schema
+from compression import Compress
+from json_provider import create_json_provider
+from metrics import Metrics
+from openapi import OpenAPIDocument, api_doc, build_spec
+import user_search
+import user_stats
+from sqlite_profile import PROFILES, apply_profile, register_pragmas
+from user_cache import create_user_cache
+
+# asgi_app（uvicorn）、server、profiling（cProfile）和 flask_swagger_ui
+# 只在用到时才导入，普通启动不为它们付出导入时间
 
 
 class Base(DeclarativeBase):
@@ -18,16 +61,54 @@ class Base(DeclarativeBase):
 db = SQLAlchemy(model_class=Base)
 
 
+def utcnow():
+    """当前UTC时间（SQLite中按不带时区的UTC存储）"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# 邮箱中第一个 @ 之后的部分（小写）
+EMAIL_DOMAIN_SQL = "lower(substr(email, instr(email, '@') + 1))"
+
+
 class User(db.Model):
     id: Mapped[int] = mapped_column(primary_key=True)
     username: Mapped[str] = mapped_column(unique=True)
-    email: Mapped[str]
+    email: Mapped[str] = mapped_column(index=True)
+    # 按邮箱域名搜索走这一列的索引；虚拟生成列不占用表的存储空间
+    email_domain: Mapped[str] = mapped_column(
+        Computed(EMAIL_DOMAIN_SQL, persisted=False), index=True
+    )
+    # 行版本号和最后修改时间，每条UPDATE语句（包括批量更新）都会自动刷新，
+    # 用于ETag、条件请求和乐观并发控制
+    version: Mapped[int] = mapped_column(
+        default=1, server_default="1", onupdate=literal_column("version") + 1
+    )
+    updated_at: Mapped[datetime] = mapped_column(default=utcnow, onupdate=utcnow)
+
+    # ETag 由 ID 和版本号组成，删除后 ID 不能被新用户重用，否则新用户会得到
+    # 与已删除用户相同的 ETag（SQLite 默认重用最大的 rowid）
+    __table_args__ = {"sqlite_autoincrement": True}
+    __mapper_args__ = {"eager_defaults": True}
+
 
+# create_all/drop_all 时一起创建、删除全文索引和统计计数，见 user_search、user_stats
+@event.listens_for(User.__table__, "after_create")
+def _create_user_triggers(target, connection, **kwargs):
+    user_search.install(connection)
+    user_stats.install(connection)
 
-app = Flask(__name__)
+
+@event.listens_for(User.__table__, "before_drop")
+def _drop_user_triggers(target, connection, **kwargs):
+    user_search.drop(connection)
+    user_stats.drop(connection)
+
+
+# 所有路由注册在蓝图上，由 create_app 注册到应用
+api = Blueprint("api", __name__)
 
 # Initialize Marshmallow
-ma = Marshmallow(app)
+ma = Marshmallow()
 
 
 # Define Schema classes
@@ -48,6 +129,10 @@ class UserCreateSchema(Schema):
     email = fields.Email(required=True)
 
 
+class UserUpsertSchema(Schema):
+    email = fields.Email(required=True)
+
+
 class UserUpdateSchema(Schema):
     username = fields.Str(validate=lambda x: len(x) >= 3 if x else None)
     email = fields.Email()
@@ -69,35 +154,308 @@ class UserIdSchema(Schema):
     id = fields.Str(required=True)
 
 
+class ErrorResponseSchema(Schema):
+    error = fields.Str(required=True)
+    details = fields.Dict()
+
+
+class DomainCountSchema(Schema):
+    domain = fields.Str(required=True)
+    users = fields.Int(required=True)
+
+
+class UserStatsSchema(Schema):
+    total = fields.Int(required=True)
+    domains = fields.List(fields.Nested(DomainCountSchema), required=True)
+    created_last_hour = fields.Int(required=True)
+    created_last_day = fields.Int(required=True)
+    created_per_minute = fields.Float(required=True)
+
+
+class UserStatsQuerySchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    domains = fields.Int(validate=validate.Range(min=0))
+
+
 class UserIdParamSchema(Schema):
     user_id = fields.Int(required=True, validate=lambda x: x > 0)
 
 
-app.config["SQLALCHEMY_ECHO"] = True
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = True
-# configure the SQLite database, relative to the app instance folder
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///project.db"
-# initialize the app with the extension
-db.init_app(app)
-with app.app_context():
-    db.create_all()
-
-# 解析命令行参数
-parser = argparse.ArgumentParser(description="Flask Demo Server")
-parser.add_argument(
-    "--document",
-    type=str,
-    default="false",
-    help="Enable swagger documentation (true/false)",
-)
-parser.add_argument(
-    "--debug", type=str, default="false", help="Enable debug mode (true/false)"
-)
-parser.add_argument("--port", type=int, default=1999, help="Port to listen on")
-args = parser.parse_args()
+def encode_cursor(value, key="id"):
+    """把最后一行的排序键（默认为用户ID）编码为不透明的分页游标"""
+    raw = json.dumps({key: value}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor, key="id"):
+    """解析分页游标，返回其中的排序键：id 为非负整数，其他键为字符串"""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        value = json.loads(base64.urlsafe_b64decode(padded))[key]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValidationError("Invalid cursor.")
+    if key != "id":
+        if not isinstance(value, str):
+            raise ValidationError("Invalid cursor.")
+    elif not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise ValidationError("Invalid cursor.")
+    return value
+
+
+class CursorField(fields.Str):
+    def _deserialize(self, value, attr, data, **kwargs):
+        return decode_cursor(super()._deserialize(value, attr, data, **kwargs))
+
+
+class FieldListField(fields.Str):
+    """逗号分隔的响应字段列表，返回按 UserResponseSchema 字段顺序去重后的元组
+
+    请求全部字段时返回 None，与不带该参数相同，两者共用同一个表示和ETag。
+    """
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        text = super()._deserialize(value, attr, data, **kwargs)
+        names = {name.strip() for name in text.split(",")} - {""}
+        allowed = UserResponseSchema.Meta.fields
+        unknown = names.difference(allowed)
+        if unknown:
+            raise ValidationError(f"Unknown field(s): {', '.join(sorted(unknown))}.")
+        if not names:
+            raise ValidationError("Provide at least one field.")
+        if len(names) == len(allowed):
+            return None
+        return tuple(name for name in allowed if name in names)
+
+
+class UserFieldsQuerySchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    # Schema 自身有 fields 属性，查询参数名通过 data_key 指定
+    field_names = FieldListField(data_key="fields")
+
+
+class UserListQuerySchema(UserFieldsQuerySchema):
+    limit = fields.Int(validate=validate.Range(min=1))
+    after = CursorField()
+
+
+# 搜索方式，每个请求只能使用其中一种
+SEARCH_MODES = ("username_prefix", "email", "email_domain", "q")
+
+
+class UserSearchQuerySchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    username_prefix = fields.Str(validate=validate.Length(min=1))
+    email = fields.Email()
+    email_domain = fields.Str(validate=validate.Length(min=1))
+    q = fields.Str()
+    limit = fields.Int(validate=validate.Range(min=1))
+    after = fields.Str()
+
+    @validates("q")
+    def validate_q(self, value, **kwargs):
+        if not value.split():
+            raise ValidationError("Search text cannot be blank.")
+
+    @validates_schema
+    def validate_mode(self, data, **kwargs):
+        if sum(mode in data for mode in SEARCH_MODES) != 1:
+            raise ValidationError(
+                "Provide exactly one of username_prefix, email, email_domain or q."
+            )
+
+
+class BulkUpdateItemSchema(UserUpdateSchema):
+    id = fields.Int(required=True, validate=validate.Range(min=1))
+
+
+class UserFilterSchema(Schema):
+    email = fields.Email()
+    email_domain = fields.Str(validate=validate.Length(min=1))
+
+    @validates_schema
+    def validate_not_empty(self, data, **kwargs):
+        if not data:
+            raise ValidationError("At least one filter field is required.")
+
+
+class BulkFilterUpdateSchema(Schema):
+    filter = fields.Nested(UserFilterSchema, required=True)
+    changes = fields.Nested(UserUpdateSchema, required=True)
+
+    @validates_schema
+    def validate_changes(self, data, **kwargs):
+        changes = data.get("changes")
+        if changes is not None and not changes:
+            raise ValidationError("No changes provided.", "changes")
+        if changes and "username" in changes:
+            # 多行同时改成同一用户名必然违反唯一约束
+            raise ValidationError(
+                "Username cannot be changed by a filtered update.", "changes"
+            )
+
+
+class BulkDeleteSchema(Schema):
+    ids = fields.List(fields.Int(validate=validate.Range(min=1)))
+    filter = fields.Nested(UserFilterSchema)
+
+    @validates_schema
+    def validate_selector(self, data, **kwargs):
+        if ("ids" in data) == ("filter" in data):
+            raise ValidationError("Provide exactly one of ids or filter.")
+
+
+def create_app(config=None):
+    """应用工厂：创建应用并注册扩展和路由
+
+    config 中的键覆盖默认配置，DB_PROFILE 选择数据库性能配置档。
+    不连接数据库，数据表在第一次请求时（或调用 init_db 时）才创建。
+    """
+    config = dict(config or {})
+    app = Flask(__name__)
+
+    # 数据库性能配置档决定 SQLALCHEMY_ECHO、连接池参数和 SQLite PRAGMA
+    apply_profile(app, config.pop("DB_PROFILE", "default"))
+    # configure the SQLite database, relative to the app instance folder
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///project.db"
+    # 用户列表分页：默认每页条数和服务端允许的最大每页条数
+    app.config["USERS_PAGE_DEFAULT_LIMIT"] = 100
+    app.config["USERS_PAGE_MAX_LIMIT"] = 1000
+    # 流式导出时每批从数据库游标读取的行数
+    app.config["USERS_EXPORT_BATCH_SIZE"] = 1000
+    # 用户统计默认返回的域名个数（按用户数从多到少）
+    app.config["USERS_STATS_DEFAULT_DOMAINS"] = 20
+    # 批量接口单次请求允许的最大条目数
+    app.config["USERS_BULK_MAX_ITEMS"] = 5000
+    # 单用户读取缓存：lru(进程内) / shared(共享缓存的本地替身) / none；
+    # 两者都只在单个进程内有效，多个工作进程的生产服务器使用 none
+    app.config["USER_CACHE_BACKEND"] = "lru"
+    app.config["USER_CACHE_MAX_SIZE"] = 10000
+    app.config["USER_CACHE_TTL"] = 60.0
+    # JSON 编码器：auto（有 orjson 时使用）/ orjson / stdlib，输出与 Flask 默认编码器一致
+    app.config["JSON_PROVIDER"] = "auto"
+    # 响应压缩：小于阈值的响应不压缩；级别越高越省带宽，也越耗CPU
+    app.config["COMPRESS_MIN_SIZE"] = 500
+    app.config["COMPRESS_LEVELS"] = {"br": 4, "zstd": 3, "gzip": 6, "deflate": 6}
+    # 按需性能分析：设置环境变量 PROFILING_TOKEN 后，请求头 X-Profile 携带该令牌的
+    # 单个请求会在分析器下运行，结果写入 PROFILING_DIR
+    app.config["PROFILING_TOKEN"] = os.environ.get("PROFILING_TOKEN")
+    app.config["PROFILING_DIR"] = os.path.join(app.instance_path, "profiles")
+    app.config["PROFILING_SAMPLE_INTERVAL"] = 0.001
+    # Swagger UI（/swagger）和 OpenAPI 文档（/static/swagger.json）
+    app.config["SWAGGER_ENABLED"] = False
+    app.config.update(config)
+    app.config.setdefault("PROFILING_ENABLED", bool(app.config["PROFILING_TOKEN"]))
+
+    # initialize the app with the extension
+    ma.init_app(app)
+    db.init_app(app)
+    with app.app_context():
+        # 只注册连接事件，不建立连接
+        register_pragmas(db.engine, app.config["SQLITE_PRAGMAS"])
+
+    app.json = create_json_provider(app)
+    # 请求计数、延迟直方图、数据库查询次数和耗时、序列化耗时，见 GET /metrics
+    metrics.init_app(app, db)
+    if app.config["PROFILING_ENABLED"]:
+        from profiling import RequestProfiler
+
+        RequestProfiler(app, db)
+    # 注册在 metrics 之后，after_request 逆序执行，压缩耗时计入请求延迟
+    Compress(app)
+    # 缓存已序列化的 UserResponseSchema 输出，写操作按ID精确失效
+    app.extensions["user_cache"] = create_user_cache(app.config)
+    # 常量响应预先编码的字节，见 constant_response
+    app.extensions["constant_bodies"] = {}
+
+    app.register_blueprint(api)
+    if app.config["SWAGGER_ENABLED"]:
+        register_swagger(app)
+    return app
+
+
+def upgrade_user_table():
+    """为旧版本创建的数据库补齐新增列、索引、全文索引和统计计数（项目没有使用迁移工具）"""
+    columns = {column["name"] for column in db.inspect(db.engine).get_columns("user")}
+    with db.engine.begin() as connection:
+        if "version" not in columns:
+            connection.exec_driver_sql(
+                "ALTER TABLE user ADD COLUMN version INTEGER NOT NULL DEFAULT 1"
+            )
+        if "updated_at" not in columns:
+            connection.exec_driver_sql(
+                "ALTER TABLE user ADD COLUMN updated_at DATETIME"
+            )
+            connection.exec_driver_sql("UPDATE user SET updated_at = CURRENT_TIMESTAMP")
+        if "email_domain" not in columns:
+            # ALTER TABLE 只能添加 VIRTUAL 生成列
+            connection.exec_driver_sql(
+                "ALTER TABLE user ADD COLUMN email_domain VARCHAR "
+                f"GENERATED ALWAYS AS ({EMAIL_DOMAIN_SQL}) VIRTUAL"
+            )
+        table_sql = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'user'"
+        ).scalar()
+        if "AUTOINCREMENT" not in table_sql.upper():
+            _rebuild_user_table(connection)
+        for index in User.__table__.indexes:
+            index.create(connection, checkfirst=True)
+        user_search.install(connection)
+        user_stats.install(connection)
+
+
+def _rebuild_user_table(connection):
+    """按当前模型重建 user 表，保留所有行和ID（ALTER TABLE 不能添加 AUTOINCREMENT）
+
+    索引和触发器随旧表一起删除，由 upgrade_user_table 随后重新创建；
+    全文索引按 rowid 引用 user 表，ID 不变所以不需要重建。
+    """
+    rebuilt = User.__table__.to_metadata(db.MetaData(), name="user_rebuild")
+    # 上次重建中途退出时可能留下新表（CREATE TABLE 不在事务中执行）
+    connection.exec_driver_sql("DROP TABLE IF EXISTS user_rebuild")
+    connection.execute(CreateTable(rebuilt))
+    names = ", ".join(
+        column.name for column in User.__table__.columns if column.computed is None
+    )
+    connection.exec_driver_sql(
+        f"INSERT INTO user_rebuild ({names}) SELECT {names} FROM user"
+    )
+    connection.exec_driver_sql("DROP TABLE user")
+    connection.exec_driver_sql("ALTER TABLE user_rebuild RENAME TO user")
+
+
+# 保护 init_db，多个线程同时处理第一批请求时只建表一次
+_init_db_lock = threading.Lock()
+
+
+def init_db(app):
+    """创建数据表并为旧库补齐新增列，每个应用只执行一次"""
+    if app.extensions.get("db_initialized"):
+        return
+    with _init_db_lock:
+        if app.extensions.get("db_initialized"):
+            return
+        with app.app_context():
+            db.create_all()
+            upgrade_user_table()
+        app.extensions["db_initialized"] = True
+
+
+@api.before_app_request
+def ensure_database():
+    # 由 WSGI 服务器或测试直接加载应用时，在第一次请求前建表
+    init_db(current_app._get_current_object())
+
+
+def register_swagger(app):
+    """注册 Swagger UI，OpenAPI 文档在第一次请求时生成并预先编码、压缩"""
+    from flask_swagger_ui import get_swaggerui_blueprint
 
-# 根据命令行参数决定是否启用Swagger
-if args.document.lower() == "true":
     # Swagger配置
     SWAGGER_URL = "/swagger"
     API_URL = "/static/swagger.json"
@@ -106,768 +464,191 @@ if args.document.lower() == "true":
     )
     app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
 
-# 根据命令行参数决定是否创建swagger.json路由
-if args.document.lower() == "true":
-
     @app.route("/static/swagger.json")
     def swagger_json():
-        json_text = """
-      
-
-{
-  "openapi": "3.1.0",
-  "info": {
-    "title": "flask-demo-project",
-    "description": "",
-    "version": "1.0.0"
-  },
-  "tags": [],
-  "paths": {
-    "/hello": {
-      "post": {
-        "summary": "返回Hello World消息（POST方法）",
-        "deprecated": false,
-        "description": "",
-        "tags": [],
-        "parameters": [],
-        "responses": {
-          "200": {
-            "description": "成功响应",
-            "content": {
-              "application/json": {
-                "schema": {
-                  "type": "object",
-                  "properties": {
-                    "message": {
-                      "type": "string"
-                    }
-                  },
-                  "required": [
-                    "message"
-                  ],
-                  "x-apifox-ignore-properties": [],
-                  "x-apifox-orders": [
-                    "message"
-                  ]
-                }
-              }
-            },
-            "headers": {},
-            "x-apifox-name": "成功"
-          }
-        },
-        "security": [],
-        "x-apifox-folder": "",
-        "x-apifox-status": "released",
-        "x-run-in-apifox": "https://app.apifox.com/web/project/6978653/apis/api-338648240-run"
-      }
-    },
-    "/": {
-      "get": {
-        "summary": "返回Hello World消息",
-        "deprecated": false,
-        "description": "",
-        "tags": [],
-        "parameters": [],
-        "responses": {
-          "200": {
-            "description": "成功响应",
-            "content": {
-              "application/json": {
-                "schema": {
-                  "type": "object",
-                  "properties": {
-                    "message": {
-                      "type": "string"
-                    }
-                  },
-                  "required": [
-                    "message"
-                  ],
-                  "x-apifox-ignore-properties": [],
-                  "x-apifox-orders": [
-                    "message"
-                  ]
-                }
-              }
-            },
-            "headers": {},
-            "x-apifox-name": "成功"
-          }
-        },
-        "security": [],
-        "x-apifox-folder": "",
-        "x-apifox-status": "released",
-        "x-run-in-apifox": "https://app.apifox.com/web/project/6978653/apis/api-338648322-run"
-      }
-    },
-    "/hi": {
-      "get": {
-        "summary": "返回Hi消息",
-        "deprecated": false,
-        "description": "",
-        "tags": [],
-        "parameters": [],
-        "responses": {
-          "200": {
-            "description": "成功响应",
-            "content": {
-              "application/json": {
-                "schema": {
-                  "type": "object",
-                  "properties": {
-                    "message": {
-                      "type": "string"
-                    }
-                  },
-                  "required": [
-                    "message"
-                  ],
-                  "x-apifox-ignore-properties": [],
-                  "x-apifox-orders": [
-                    "message"
-                  ]
-                }
-              }
-            },
-            "headers": {},
-            "x-apifox-name": "成功"
-          }
-        },
-        "security": [],
-        "x-apifox-folder": "",
-        "x-apifox-status": "released",
-        "x-run-in-apifox": "https://app.apifox.com/web/project/6978653/apis/api-338648421-run"
-      }
-    },
-    "/user/{id}": {
-      "get": {
-        "summary": "根据用户ID返回对应的框架名称",
-        "deprecated": false,
-        "description": "",
-        "tags": [],
-        "parameters": [
-          {
-            "name": "id",
-            "in": "path",
-            "description": "用户ID",
-            "required": true,
-            "example": "",
-            "schema": {
-              "type": "string"
-            }
-          }
-        ],
-        "responses": {
-          "200": {
-            "description": "成功响应",
-            "content": {
-              "application/json": {
-                "schema": {
-                  "type": "object",
-                  "properties": {
-                    "framework": {
-                      "type": "string"
-                    }
-                  },
-                  "required": [
-                    "framework"
-                  ],
-                  "x-apifox-ignore-properties": [],
-                  "x-apifox-orders": [
-                    "framework"
-                  ]
-                }
-              }
-            },
-            "headers": {},
-            "x-apifox-name": "成功"
-          }
-        },
-        "security": [],
-        "x-apifox-folder": "",
-        "x-apifox-status": "released",
-        "x-run-in-apifox": "https://app.apifox.com/web/project/6978653/apis/api-338659904-run"
-      }
-    },
-    "/api/users": {
-      "get": {
-        "summary": "获取所有用户列表",
-        "deprecated": false,
-        "description": "",
-        "tags": [],
-        "parameters": [],
-        "responses": {
-          "200": {
-            "description": "成功响应",
-            "content": {
-              "application/json": {
-                "schema": {
-                  "type": "array",
-                  "items": {
-                    "type": "object",
-                    "properties": {
-                      "email": {
-                        "type": "string"
-                      },
-                      "id": {
-                        "type": "integer"
-                      },
-                      "username": {
-                        "type": "string"
-                      }
-                    },
-                    "x-apifox-ignore-properties": [],
-                    "x-apifox-orders": [
-                      "email",
-                      "id",
-                      "username"
-                    ]
-                  }
-                }
-              }
-            },
-            "headers": {},
-            "x-apifox-name": "成功"
-          }
-        },
-        "security": [],
-        "x-apifox-folder": "",
-        "x-apifox-status": "released",
-        "x-run-in-apifox": "https://app.apifox.com/web/project/6978653/apis/api-338737339-run"
-      },
-      "post": {
-        "summary": "创建新用户",
-        "deprecated": false,
-        "description": "",
-        "tags": [],
-        "parameters": [],
-        "requestBody": {
-          "content": {
-            "application/json": {
-              "schema": {
-                "properties": {
-                  "email": {
-                    "type": "string"
-                  },
-                  "username": {
-                    "type": "string"
-                  }
-                },
-                "required": [
-                  "username",
-                  "email"
-                ],
-                "type": "object",
-                "x-apifox-orders": [
-                  "email",
-                  "username"
-                ],
-                "x-apifox-ignore-properties": []
-              }
-            }
-          }
-        },
-        "responses": {
-          "201": {
-            "description": "用户创建成功",
-            "content": {
-              "application/json": {
-                "schema": {
-                  "type": "object",
-                  "properties": {
-                    "email": {
-                      "type": "string"
-                    },
-                    "id": {
-                      "type": "integer"
-                    },
-                    "username": {
-                      "type": "string"
-                    }
-                  },
-                  "required": [
-                    "email",
-                    "id",
-                    "username"
-                  ],
-                  "x-apifox-ignore-properties": [],
-                  "x-apifox-orders": [
-                    "email",
-                    "id",
-                    "username"
-                  ]
-                }
-              }
-            },
-            "headers": {},
-            "x-apifox-name": "成功"
-          },
-          "400": {
-            "description": "请求参数错误",
-            "content": {
-              "application/json": {
-                "schema": {
-                  "type": "object",
-                  "properties": {},
-                  "x-apifox-orders": [],
-                  "x-apifox-ignore-properties": []
-                }
-              }
-            },
-            "headers": {},
-            "x-apifox-name": "请求有误"
-          }
-        },
-        "security": [],
-        "x-apifox-folder": "",
-        "x-apifox-status": "released",
-        "x-run-in-apifox": "https://app.apifox.com/web/project/6978653/apis/api-338737340-run"
-      }
-    },
-    "/api/users/{user_id}": {
-      "delete": {
-        "summary": "删除用户",
-        "deprecated": false,
-        "description": "",
-        "tags": [],
-        "parameters": [
-          {
-            "name": "user_id",
-            "in": "path",
-            "description": "用户ID",
-            "required": true,
-            "example": 0,
-            "schema": {
-              "type": "integer"
-            }
-          }
-        ],
-        "responses": {
-          "200": {
-            "description": "删除成功",
-            "content": {
-              "application/json": {
-                "schema": {
-                  "type": "object",
-                  "properties": {
-                    "id": {
-                      "type": "integer"
-                    },
-                    "message": {
-                      "type": "string"
-                    }
-                  },
-                  "required": [
-                    "id",
-                    "message"
-                  ],
-                  "x-apifox-ignore-properties": [],
-                  "x-apifox-orders": [
-                    "id",
-                    "message"
-                  ]
-                }
-              }
-            },
-            "headers": {},
-            "x-apifox-name": "成功"
-          },
-          "404": {
-            "description": "用户不存在",
-            "content": {
-              "application/json": {
-                "schema": {
-                  "type": "object",
-                  "properties": {},
-                  "x-apifox-orders": [],
-                  "x-apifox-ignore-properties": []
-                }
-              }
-            },
-            "headers": {},
-            "x-apifox-name": "记录不存在"
-          }
-        },
-        "security": [],
-        "x-apifox-folder": "",
-        "x-apifox-status": "released",
-        "x-run-in-apifox": "https://app.apifox.com/web/project/6978653/apis/api-338737341-run"
-      },
-      "get": {
-        "summary": "根据ID获取用户信息",
-        "deprecated": false,
-        "description": "",
-        "tags": [],
-        "parameters": [
-          {
-            "name": "user_id",
-            "in": "path",
-            "description": "用户ID",
-            "required": true,
-            "example": 0,
-            "schema": {
-              "type": "integer"
-            }
-          }
-        ],
-        "responses": {
-          "200": {
-            "description": "成功响应",
-            "content": {
-              "application/json": {
-                "schema": {
-                  "type": "object",
-                  "properties": {
-                    "email": {
-                      "type": "string"
-                    },
-                    "id": {
-                      "type": "integer"
-                    },
-                    "username": {
-                      "type": "string"
-                    }
-                  },
-                  "required": [
-                    "email",
-                    "id",
-                    "username"
-                  ],
-                  "x-apifox-ignore-properties": [],
-                  "x-apifox-orders": [
-                    "email",
-                    "id",
-                    "username"
-                  ]
-                }
-              }
-            },
-            "headers": {},
-            "x-apifox-name": "成功"
-          },
-          "404": {
-            "description": "用户不存在",
-            "content": {
-              "application/json": {
-                "schema": {
-                  "type": "object",
-                  "properties": {},
-                  "x-apifox-orders": [],
-                  "x-apifox-ignore-properties": []
-                }
-              }
-            },
-            "headers": {},
-            "x-apifox-name": "记录不存在"
-          }
-        },
-        "security": [],
-        "x-apifox-folder": "",
-        "x-apifox-status": "released",
-        "x-run-in-apifox": "https://app.apifox.com/web/project/6978653/apis/api-338737342-run"
-      },
-      "put": {
-        "summary": "更新用户信息",
-        "deprecated": false,
-        "description": "",
-        "tags": [],
-        "parameters": [
-          {
-            "name": "user_id",
-            "in": "path",
-            "description": "用户ID",
-            "required": true,
-            "example": 0,
-            "schema": {
-              "type": "integer"
-            }
-          }
-        ],
-        "requestBody": {
-          "content": {
-            "application/json": {
-              "schema": {
-                "properties": {
-                  "email": {
-                    "type": "string"
-                  },
-                  "username": {
-                    "type": "string"
-                  }
-                },
-                "type": "object",
-                "x-apifox-orders": [
-                  "email",
-                  "username"
-                ],
-                "x-apifox-ignore-properties": []
-              }
-            }
-          }
-        },
-        "responses": {
-          "200": {
-            "description": "更新成功",
-            "content": {
-              "application/json": {
-                "schema": {
-                  "type": "object",
-                  "properties": {
-                    "email": {
-                      "type": "string"
-                    },
-                    "id": {
-                      "type": "integer"
-                    },
-                    "username": {
-                      "type": "string"
-                    }
-                  },
-                  "required": [
-                    "email",
-                    "id",
-                    "username"
-                  ],
-                  "x-apifox-ignore-properties": [],
-                  "x-apifox-orders": [
-                    "email",
-                    "id",
-                    "username"
-                  ]
-                }
-              }
-            },
-            "headers": {},
-            "x-apifox-name": "成功"
-          },
-          "400": {
-            "description": "请求参数错误",
-            "content": {
-              "application/json": {
-                "schema": {
-                  "type": "object",
-                  "properties": {},
-                  "x-apifox-orders": [],
-                  "x-apifox-ignore-properties": []
-                }
-              }
-            },
-            "headers": {},
-            "x-apifox-name": "请求有误"
-          },
-          "404": {
-            "description": "用户不存在",
-            "content": {
-              "application/json": {
-                "schema": {
-                  "type": "object",
-                  "properties": {},
-                  "x-apifox-orders": [],
-                  "x-apifox-ignore-properties": []
-                }
-              }
-            },
-            "headers": {},
-            "x-apifox-name": "记录不存在"
-          }
-        },
-        "security": [],
-        "x-apifox-folder": "",
-        "x-apifox-status": "released",
-        "x-run-in-apifox": "https://app.apifox.com/web/project/6978653/apis/api-338737343-run"
-      }
-    },
-    "/method": {
-      "get": {
-        "summary": "返回请求方法（GET）",
-        "deprecated": false,
-        "description": "",
-        "tags": [],
-        "parameters": [],
-        "responses": {
-          "200": {
-            "description": "成功响应",
-            "content": {
-              "application/json": {
-                "schema": {
-                  "type": "object",
-                  "properties": {
-                    "method": {
-                      "type": "string"
-                    }
-                  },
-                  "required": [
-                    "method"
-                  ],
-                  "x-apifox-ignore-properties": [],
-                  "x-apifox-orders": [
-                    "method"
-                  ]
-                }
-              }
-            },
-            "headers": {},
-            "x-apifox-name": "成功"
-          }
-        },
-        "security": [],
-        "x-apifox-folder": "",
-        "x-apifox-status": "released",
-        "x-run-in-apifox": "https://app.apifox.com/web/project/6978653/apis/api-338678891-run"
-      },
-      "post": {
-        "summary": "返回请求方法（POST）",
-        "deprecated": false,
-        "description": "",
-        "tags": [],
-        "parameters": [],
-        "responses": {
-          "200": {
-            "description": "成功响应",
-            "content": {
-              "application/json": {
-                "schema": {
-                  "type": "object",
-                  "properties": {
-                    "method": {
-                      "type": "string"
-                    }
-                  },
-                  "required": [
-                    "method"
-                  ],
-                  "x-apifox-ignore-properties": [],
-                  "x-apifox-orders": [
-                    "method"
-                  ]
-                }
-              }
-            },
-            "headers": {},
-            "x-apifox-name": "成功"
-          }
-        },
-        "security": [],
-        "x-apifox-folder": "",
-        "x-apifox-status": "released",
-        "x-run-in-apifox": "https://app.apifox.com/web/project/6978653/apis/api-338678892-run"
-      }
-    },
-    "/user-info": {
-      "get": {
-        "summary": "返回用户信息",
-        "deprecated": false,
-        "description": "",
-        "tags": [],
-        "parameters": [],
-        "responses": {
-          "200": {
-            "description": "成功响应",
-            "content": {
-              "application/json": {
-                "schema": {
-                  "type": "object",
-                  "properties": {
-                    "name": {
-                      "type": "string"
-                    }
-                  },
-                  "required": [
-                    "name"
-                  ],
-                  "x-apifox-ignore-properties": [],
-                  "x-apifox-orders": [
-                    "name"
-                  ]
-                }
-              }
-            },
-            "headers": {},
-            "x-apifox-name": "成功"
-          }
-        },
-        "security": [],
-        "x-apifox-folder": "",
-        "x-apifox-status": "released",
-        "x-run-in-apifox": "https://app.apifox.com/web/project/6978653/apis/api-338737344-run"
-      }
+        document = app.extensions.get("openapi_document")
+        if document is None:
+            document = OpenAPIDocument(build_spec(app, "flask-demo-project"))
+            app.extensions["openapi_document"] = document
+        return document.response(request)
+
+
+# 运行指标在进程内共享，create_app 时绑定到应用
+metrics = Metrics()
+
+
+@functools.cache
+def compiled(schema_class, many=False):
+    """已编译的 Schema，dump 耗时计入序列化指标"""
+    return metrics.timed(fast_schema.compiled(schema_class, many))
+
+
+# 当前应用的用户缓存，见 create_app
+user_cache = LocalProxy(lambda: current_app.extensions["user_cache"])
+
+
+def user_etag(user_id, version, names=None):
+    """单个用户的强ETag，由主键和行版本号决定；部分字段的表示在后面附加字段列表"""
+    if names is None:
+        return f"{user_id}-{version}"
+    return f"{user_id}-{version}-{'.'.join(names)}"
+
+
+def _user_cache_entry(user):
+    """缓存条目：序列化结果加上生成ETag和Last-Modified所需的版本信息"""
+    return {
+        "data": compiled(UserResponseSchema).dump(user),
+        "version": user.version,
+        "updated_at": user.updated_at.replace(tzinfo=timezone.utc).timestamp(),
     }
-  },
-  "webhooks": {},
-  "components": {
-    "schemas": {},
-    "securitySchemes": {}
-  },
-  "servers": [],
-  "security": []
-}
 
 
+def _set_user_validators(response, user_id, version, updated_at, names=None):
+    response.set_etag(user_etag(user_id, version, names))
+    response.last_modified = updated_at
+    return response
+
+
+def _not_modified(etag, last_modified=None):
+    """处理 If-None-Match / If-Modified-Since，命中时直接返回304，跳过序列化"""
+    if last_modified is not None and last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    if request.if_none_match:
+        matched = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified is not None:
+        matched = last_modified.replace(microsecond=0) <= request.if_modified_since
+    else:
+        matched = False
+    if not matched:
+        return None
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+def _abort_json(status, error, details=None):
+    """以JSON错误响应中止请求（同步和异步处理函数共用）"""
+    body = {"error": error}
+    if details is not None:
+        body["details"] = details
+    response = jsonify(body)
+    response.status_code = status
+    abort(response)
+
+
+def _validated(schema_class, data, error="Validation error"):
+    """按 schema_class 校验输入，失败时以400响应中止请求"""
+    try:
+        return compiled(schema_class).load(data)
+    except ValidationError as err:
+        _abort_json(400, error, err.messages)
+
+
+def _found(row):
+    """查询结果为 None 时以404中止请求"""
+    if row is None:
+        abort(404)
+    return row
+
+
+def _user_response(user, status=200):
+    """单个用户的响应，带 ETag 和 Last-Modified
+
+    同步会话提交后对象会过期，需要在提交前调用，以免重新加载。
+    """
+    response = jsonify(compiled(UserResponseSchema).dump(user))
+    response.status_code = status
+    return _set_user_validators(response, user.id, user.version, user.updated_at)
+
+
+def _username_taken():
+    return jsonify({"error": "Username already exists"}), 400
+
+
+def _constant_body(schema_class, **data):
+    """常量响应的JSON字节和ETag，每个应用在首次请求时编码一次
 
-        """
-        swagger_spec = json.loads(json_text)
-        return jsonify(swagger_spec)
+    JSON 编码设置（如调试模式下的缩进）在首次请求前已确定，之后不再变化。
+    """
+    bodies = current_app.extensions["constant_bodies"]
+    key = (schema_class, *data.items())
+    cached = bodies.get(key)
+    if cached is None:
+        body = current_app.json.response(compiled(schema_class).dump(data)).get_data()
+        cached = bodies[key] = (body, hashlib.sha1(body).hexdigest())
+    return cached
+
+
+def constant_response(schema_class, **data):
+    """返回预先编码的响应，每个请求新建 Response 对象，after_request 钩子可以安全修改"""
+    body, etag = _constant_body(schema_class, **data)
+    # 没有条件请求头时跳过请求头解析
+    if "HTTP_IF_NONE_MATCH" in request.environ:
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
+    response = current_app.response_class(body, mimetype=current_app.json.mimetype)
+    response.set_etag(etag)
+    return response
+
+
+# /user/<id> 的ID到框架名称的映射，其余ID返回 "hello world"
+FRAMEWORKS = {"1": "python", "2": "django", "3": "flask"}
 
 
 # 保持原有的路由
-@app.route("/")
+@api.route("/")
+@api_doc("返回Hello World消息", {200: ("成功响应", MessageResponseSchema)})
 def index():
-    schema = MessageResponseSchema()
-    result = schema.dump({"message": "Hello, World!"})
-    return jsonify(result)
+    return constant_response(MessageResponseSchema, message="Hello, World!")
 
 
-@app.route("/hi")
+@api.route("/hi")
+@api_doc("返回Hi消息", {200: ("成功响应", MessageResponseSchema)})
 def hi():
-    schema = MessageResponseSchema()
-    result = schema.dump({"message": "Hi!"})
-    return jsonify(result)
+    return constant_response(MessageResponseSchema, message="Hi!")
 
 
-@app.route("/hello", methods=["POST"])
+@api.route("/hello", methods=["POST"])
+@api_doc("返回Hello World消息（POST方法）", {200: ("成功响应", MessageResponseSchema)})
 def hello():
-    schema = MessageResponseSchema()
-    result = schema.dump({"message": "Hello, World!"})
-    return jsonify(result)
+    return constant_response(MessageResponseSchema, message="Hello, World!")
 
 
-@app.route("/user/<id>")
+@api.route("/user/<id>")
+@api_doc(
+    "根据用户ID返回对应的框架名称",
+    {
+        200: ("成功响应", FrameworkResponseSchema),
+        400: ("请求参数错误", ErrorResponseSchema),
+    },
+)
 def user(id):
     # Validate path parameter
     try:
-        param_schema = UserIdSchema()
+        param_schema = compiled(UserIdSchema)
         param_schema.load({"id": id})
     except ValidationError as err:
         return jsonify({"error": "invalid id parameter", "details": err.messages}), 400
 
     # Determine framework based on id
-    if id == "1":
-        framework = "python"
-    elif id == "2":
-        framework = "django"
-    elif id == "3":
-        framework = "flask"
-    else:
-        framework = "hello world"
-
-    schema = FrameworkResponseSchema()
-    result = schema.dump({"framework": framework})
-    return jsonify(result)
+    framework = FRAMEWORKS.get(id, "hello world")
+    return constant_response(FrameworkResponseSchema, framework=framework)
 
 
-@app.route("/method", methods=["GET", "POST"])
+@api.route("/method", methods=["GET", "POST"])
+@api_doc("返回请求方法", {200: ("成功响应", MethodResponseSchema)})
 def get_method():
-    schema = MethodResponseSchema()
-    result = schema.dump({"method": request.method})
-    return jsonify(result)
+    # 方法只有 GET、POST、HEAD 几种，每种缓存一份
+    return constant_response(MethodResponseSchema, method=request.method)
 
 
-@app.route("/user-info", methods=["get"])
+@api.route("/user-info", methods=["get"])
+@api_doc("返回用户信息", {200: ("成功响应", UserInfoSchema)})
 def user_info():
-    schema = UserInfoSchema()
-    result = schema.dump({"name": "张三"})
-    return jsonify(result)
+    return constant_response(UserInfoSchema, name="张三")
 
 # 使用 SQLAlchemyAutoSchema 自动生成
 class UserResponseSchema(SQLAlchemyAutoSchema):
@@ -875,82 +656,801 @@ class UserResponseSchema(SQLAlchemyAutoSchema):
         model = User
         fields = ("id", "username", "email")
         load_instance = True  # 支持直接生成模型实例
+
+
+@functools.cache
+def projected_schema(names=None):
+    """只输出 names 中字段的 UserResponseSchema 子类，每种字段组合只创建一次"""
+    if names is None:
+        return UserResponseSchema
+    meta = type("Meta", (UserResponseSchema.Meta,), {"fields": names})
+    return type("UserResponseSchema", (UserResponseSchema,), {"Meta": meta})
+
+
+def _user_columns(names, *extra):
+    """只查询需要的列：响应字段加上分页、ETag等额外需要的列"""
+    names = names or UserResponseSchema.Meta.fields
+    return [getattr(User, name) for name in dict.fromkeys((*names, *extra))]
+
+
+def _page_query(limit, last_id, names):
+    """下一页的查询参数，保留部分字段参数"""
+    query = {"limit": limit, "after": encode_cursor(last_id)}
+    if names is not None:
+        query["fields"] = ",".join(names)
+    return query
+
+
 # User RESTful API endpoints
-@app.route("/api/users", methods=["GET"])
+@api.route("/api/users", methods=["GET"])
+@api_doc(
+    "获取用户列表（游标分页）",
+    {
+        200: ("成功响应，下一页地址见 Link 响应头", UserResponseSchema(many=True)),
+        304: ("内容未变化", None),
+        400: ("请求参数错误", ErrorResponseSchema),
+    },
+    query=UserListQuerySchema,
+)
 def get_users():
-    users = User.query.all()
-    schema = UserResponseSchema(many=True)
-    result = schema.dump(users)
-    return jsonify(result)
+    # 客户端明确要求NDJSON时走流式导出
+    if _wants_ndjson():
+        return export_users()
+
+    page = _UserPage(request.args)
+    # 条件请求先只取ID和版本号计算ETag，未变化时不加载整行也不序列化
+    if request.if_none_match:
+        versions = db.session.execute(page.versions_statement).all()
+        not_modified = page.not_modified(versions)
+        if not_modified:
+            return not_modified
+    return page.response(db.session.execute(page.statement).all())
+
+
+def _wants_ndjson():
+    mimetype = request.accept_mimetypes.best_match(
+        ["application/json", "application/x-ndjson"]
+    )
+    return mimetype == "application/x-ndjson"
+
+
+class _UserPage:
+    """一页用户列表：解析分页参数、生成查询语句，由查询结果生成响应
+
+    基于主键的游标分页，深分页与第一页代价相同，顺序始终稳定。
+    同步和异步处理函数共用，只有执行查询的方式不同。
+    """
+
+    def __init__(self, args):
+        query = _validated(UserListQuerySchema, args, "invalid query parameter")
+        config = current_app.config
+        self.limit = min(
+            query.get("limit", config["USERS_PAGE_DEFAULT_LIMIT"]),
+            config["USERS_PAGE_MAX_LIMIT"],
+        )
+        self.after = query.get("after", 0)
+        self.names = query.get("field_names")
+        # 只查询响应字段和ETag需要的列，直接序列化结果行，不构造ORM对象；
+        # 多取一行用于判断是否还有下一页
+        self.statement = (
+            db.select(*_user_columns(self.names, "id", "version"))
+            .where(User.id > self.after)
+            .order_by(User.id)
+            .limit(self.limit + 1)
+        )
+        self.versions_statement = self.statement.with_only_columns(
+            User.id, User.version
+        )
+
+    def etag(self, rows):
+        versions = [(row.id, row.version) for row in rows]
+        return _page_etag(self.after, self.limit, versions, self.names)
+
+    def not_modified(self, versions):
+        """versions 为 versions_statement 的结果，ETag 未变化时返回304"""
+        return _not_modified(self.etag(versions))
+
+    def response(self, rows):
+        """rows 为 statement 的结果"""
+        etag = self.etag(rows)
+        has_next = len(rows) > self.limit
+        rows = rows[: self.limit]
+        schema = compiled(projected_schema(self.names), many=True)
+        response = jsonify(schema.dump(rows))
+        response.set_etag(etag)
+        if has_next:
+            query = _page_query(self.limit, rows[-1].id, self.names)
+            next_url = url_for("api.get_users", **query)
+            response.headers["Link"] = f'<{next_url}>; rel="next"'
+        return response
+
+
+def _page_etag(after, limit, versions, names=None):
+    """列表页的ETag，由分页参数、响应字段和页内每行的ID、版本号决定"""
+    key = f"{after}:{limit}:{versions!r}"
+    if names is not None:
+        key += ":" + ",".join(names)
+    return "p-" + hashlib.sha1(key.encode("ascii")).hexdigest()
+
+
+@api.route("/api/users/export", methods=["GET"])
+@api_doc(
+    "以NDJSON格式流式导出全部用户",
+    {200: ("每行一个用户对象（application/x-ndjson）", UserResponseSchema)},
+)
+def export_users():
+    """以NDJSON格式流式导出全部用户，内存占用与表大小无关"""
+    schema = compiled(UserResponseSchema)
+    columns = [getattr(User, name) for name in UserResponseSchema.Meta.fields]
+    statement = (
+        db.select(*columns)
+        .order_by(User.id)
+        .execution_options(yield_per=current_app.config["USERS_EXPORT_BATCH_SIZE"])
+    )
+
+    def generate():
+        # 服务端游标按批读取，每批编码后立即发送
+        for rows in db.session.execute(statement).partitions():
+            yield "".join(
+                current_app.json.dumps(schema.dump(row), separators=(",", ":")) + "\n"
+                for row in rows
+            )
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@api.route("/api/users/stats", methods=["GET"])
+@api_doc(
+    "用户统计：总数、各邮箱域名的用户数和最近的创建速率",
+    {
+        200: ("成功响应", UserStatsSchema),
+        400: ("请求参数错误", ErrorResponseSchema),
+    },
+    query=UserStatsQuerySchema,
+)
+def get_user_stats():
+    """读取触发器维护的计数，耗时与用户数无关"""
+    try:
+        query = compiled(UserStatsQuerySchema).load(request.args)
+    except ValidationError as err:
+        return (
+            jsonify({"error": "invalid query parameter", "details": err.messages}),
+            400,
+        )
+
+    domains = min(
+        query.get("domains", current_app.config["USERS_STATS_DEFAULT_DOMAINS"]),
+        current_app.config["USERS_PAGE_MAX_LIMIT"],
+    )
+    stats = user_stats.read(db.session.connection(), domains)
+    return jsonify(compiled(UserStatsSchema).dump(stats))
 
 
-@app.route("/api/users", methods=["POST"])
+@api.route("/api/users/search", methods=["GET"])
+@api_doc(
+    "搜索用户：用户名前缀、精确邮箱、邮箱域名或全文检索（游标分页）",
+    {
+        200: ("成功响应，下一页地址见 Link 响应头", UserResponseSchema(many=True)),
+        400: ("请求参数错误", ErrorResponseSchema),
+    },
+    query=UserSearchQuerySchema,
+)
+def search_users():
+    try:
+        query = compiled(UserSearchQuerySchema).load(request.args)
+    except ValidationError as err:
+        return (
+            jsonify({"error": "invalid query parameter", "details": err.messages}),
+            400,
+        )
+
+    # 每种搜索都由索引直接按排序列的顺序给出结果，翻页只需从上一页最后一行继续
+    statement, order_column, cursor_key = _search_statement(query)
+    if "after" in query:
+        try:
+            after = decode_cursor(query["after"], cursor_key)
+        except ValidationError as err:
+            details = {"after": err.messages}
+            return (
+                jsonify({"error": "invalid query parameter", "details": details}),
+                400,
+            )
+        statement = statement.where(order_column > after)
+    limit = min(
+        query.get("limit", current_app.config["USERS_PAGE_DEFAULT_LIMIT"]),
+        current_app.config["USERS_PAGE_MAX_LIMIT"],
+    )
+    users = db.session.scalars(statement.order_by(order_column).limit(limit + 1)).all()
+    has_next = len(users) > limit
+    users = users[:limit]
+
+    schema = compiled(UserResponseSchema, many=True)
+    response = jsonify(schema.dump(users))
+    if has_next:
+        mode = next(mode for mode in SEARCH_MODES if mode in query)
+        next_url = url_for(
+            ".search_users",
+            **{mode: query[mode]},
+            limit=limit,
+            after=encode_cursor(getattr(users[-1], cursor_key), cursor_key),
+        )
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
+
+
+def _search_statement(query):
+    """返回搜索语句、分页排序列和游标中保存的用户属性
+
+    用户名前缀转换为唯一索引上的范围查询，结果按用户名排序；邮箱和邮箱域名使用
+    各自的索引，索引项内按ID有序；全文检索由 FTS5 按 rowid（即用户ID）顺序返回。
+    """
+    if "username_prefix" in query:
+        prefix = query["username_prefix"]
+        statement = db.select(User).where(User.username >= prefix)
+        upper = user_search.prefix_upper_bound(prefix)
+        if upper is not None:
+            statement = statement.where(User.username < upper)
+        return statement, User.username, "username"
+    if "email" in query:
+        return db.select(User).where(User.email == query["email"]), User.id, "id"
+    if "email_domain" in query:
+        domain = query["email_domain"].lower()
+        return db.select(User).where(User.email_domain == domain), User.id, "id"
+    fts = user_search.user_fts
+    statement = (
+        db.select(User)
+        .join(fts, fts.c.rowid == User.id)
+        .where(fts.c.user_fts.match(user_search.match_expression(query["q"])))
+    )
+    return statement, fts.c.rowid, "id"
+
+
+@api.route("/api/users", methods=["POST"])
+@api_doc(
+    "创建新用户",
+    {
+        201: ("用户创建成功", UserResponseSchema),
+        400: ("请求参数错误", ErrorResponseSchema),
+    },
+    request=UserCreateSchema,
+)
 def create_user():
+    validated_data = _validated(UserCreateSchema, request.get_json())
+
+    # 单条 INSERT ... RETURNING，用户名冲突由唯一约束检查，不需要预先查询
+    try:
+        user = db.session.scalars(_insert_statement(validated_data)).one()
+        user_id, response = user.id, _user_response(user, 201)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return _username_taken()
+    user_cache.delete(user_id)
+    return response
+
+
+def _insert_statement(data):
+    statement = db.insert(User).values(username=data["username"], email=data["email"])
+    return statement.returning(User)
+
+
+def _bulk_items(data):
+    """校验批量请求体，返回错误响应或None"""
+    if not isinstance(data, list) or not data:
+        return jsonify({"error": "Expected a non-empty list"}), 400
+    max_items = current_app.config["USERS_BULK_MAX_ITEMS"]
+    if len(data) > max_items:
+        return jsonify({"error": f"Too many items, at most {max_items} allowed"}), 400
+    return None
+
+
+@api.route("/api/users/bulk", methods=["POST"])
+@api_doc(
+    "批量创建用户",
+    {
+        201: ("全部创建成功", None),
+        207: ("部分条目失败，逐条结果见 results", None),
+        400: ("请求参数错误", ErrorResponseSchema),
+    },
+    request=UserCreateSchema(many=True),
+)
+def bulk_create_users():
+    data = request.get_json()
+    error = _bulk_items(data)
+    if error:
+        return error
+
+    # 逐条校验，错误按条目返回而不是让整批失败
+    schema = compiled(UserCreateSchema)
+    results = [None] * len(data)
+    validated = {}
+    for index, item in enumerate(data):
+        try:
+            validated[index] = schema.load(item)
+        except ValidationError as err:
+            results[index] = {
+                "index": index,
+                "status": "error",
+                "error": "Validation error",
+                "details": err.messages,
+            }
+
+    # 批次内重复的用户名只保留第一条
+    seen = set()
+    rows = []
+    row_indexes = []
+    for index, item in validated.items():
+        if item["username"] in seen:
+            results[index] = {
+                "index": index,
+                "status": "error",
+                "error": "Username already exists",
+            }
+            continue
+        seen.add(item["username"])
+        rows.append({"username": item["username"], "email": item["email"]})
+        row_indexes.append(index)
+
+    # 单个事务内批量插入，提交前完成序列化以免提交后逐行重新加载。
+    # 表中已存在的用户名由唯一约束跳过（ON CONFLICT DO NOTHING），不预先查询，
+    # 并发写入抢占用户名时也只影响对应条目
+    created = 0
+    if rows:
+        # 不要求 RETURNING 按参数顺序返回，SQLite 上那样会退化为逐行 INSERT；
+        # 批内用户名唯一，按用户名对应回请求条目
+        statement = sqlite_insert(User).on_conflict_do_nothing(
+            index_elements=[User.username]
+        )
+        users = db.session.scalars(statement.returning(User), rows).all()
+        by_username = {user.username: user for user in users}
+        response_schema = compiled(UserResponseSchema)
+        for index in row_indexes:
+            user = by_username.get(validated[index]["username"])
+            if user is None:
+                results[index] = {
+                    "index": index,
+                    "status": "error",
+                    "error": "Username already exists",
+                }
+                continue
+            results[index] = {
+                "index": index,
+                "status": "created",
+                "user": response_schema.dump(user),
+            }
+        # 提交后对象会过期，先记下ID以免逐行重新加载
+        created_ids = [user.id for user in users]
+        db.session.commit()
+        user_cache.delete_many(created_ids)
+        created = len(users)
+
+    result = {
+        "created": created,
+        "failed": len(data) - created,
+        "results": results,
+    }
+    return jsonify(result), 201 if created == len(data) else 207
+
+
+def _user_filter_clause(criteria):
+    """把过滤条件转换为SQL条件表达式"""
+    clauses = []
+    if "email" in criteria:
+        clauses.append(User.email == criteria["email"])
+    if "email_domain" in criteria:
+        # 与搜索接口一致：不区分大小写，使用 email_domain 生成列上的索引
+        clauses.append(User.email_domain == criteria["email_domain"].lower())
+    return db.and_(*clauses)
+
+
+@api.route("/api/users/bulk", methods=["PATCH"])
+@api_doc(
+    "批量更新用户",
+    {
+        200: ("全部更新成功", None),
+        207: ("部分条目失败，逐条结果见 results", None),
+        400: ("请求参数错误", ErrorResponseSchema),
+    },
+    request=[BulkUpdateItemSchema(many=True), BulkFilterUpdateSchema],
+)
+def bulk_update_users():
     data = request.get_json()
+    if isinstance(data, dict):
+        return _bulk_update_by_filter(data)
+    error = _bulk_items(data)
+    if error:
+        return error
+
+    # 逐条用 UserUpdateSchema 规则校验
+    schema = compiled(BulkUpdateItemSchema)
+    results = [None] * len(data)
+    validated = {}
+    seen_ids = set()
+    for index, item in enumerate(data):
+        try:
+            changes = schema.load(item)
+        except ValidationError as err:
+            results[index] = {
+                "index": index,
+                "status": "error",
+                "error": "Validation error",
+                "details": err.messages,
+            }
+            continue
+        if len(changes) == 1:
+            error = "No data provided"
+        elif changes["id"] in seen_ids:
+            error = "Duplicate id in batch"
+        else:
+            seen_ids.add(changes["id"])
+            validated[index] = changes
+            continue
+        results[index] = {
+            "index": index,
+            "id": changes["id"],
+            "status": "error",
+            "error": error,
+        }
+
+    # 一次查询确认哪些ID存在，一次查询找出用户名冲突
+    existing_ids = set(
+        db.session.scalars(db.select(User.id).where(User.id.in_(seen_ids)))
+    )
+    new_usernames = {
+        changes["username"] for changes in validated.values() if "username" in changes
+    }
+    owners = dict(
+        db.session.execute(
+            db.select(User.username, User.id).where(User.username.in_(new_usernames))
+        ).all()
+    )
+    rows = []
+    row_indexes = []
+    missing = []
+    for index, changes in validated.items():
+        user_id = changes["id"]
+        result = {"index": index, "id": user_id}
+        if user_id not in existing_ids:
+            result.update(status="not_found", error="User not found")
+            missing.append(user_id)
+        elif (
+            "username" in changes
+            and owners.get(changes["username"], user_id) != user_id
+        ):
+            result.update(status="error", error="Username already exists")
+        else:
+            if "username" in changes:
+                owners[changes["username"]] = user_id
+            result["status"] = "updated"
+            rows.append(changes)
+            row_indexes.append(index)
+        results[index] = result
+
+    # 按主键批量更新，单个事务提交
+    if rows:
+        try:
+            db.session.execute(db.update(User), rows)
+        except IntegrityError:
+            # 预查询之后并发请求抢占了用户名：回滚后逐行更新，只有冲突的条目失败。
+            # SQLite 中违反约束只撤销出错的那条语句，事务中之前的更新仍然保留
+            db.session.rollback()
+            updated_rows = []
+            for index, changes in zip(row_indexes, rows):
+                try:
+                    db.session.execute(db.update(User), [changes])
+                except IntegrityError:
+                    results[index].update(
+                        status="error", error="Username already exists"
+                    )
+                    continue
+                updated_rows.append(changes)
+            rows = updated_rows
+        db.session.commit()
+        user_cache.delete_many(changes["id"] for changes in rows)
+
+    result = {
+        "updated": [changes["id"] for changes in rows],
+        "missing": missing,
+        "results": results,
+    }
+    return jsonify(result), 200 if len(rows) == len(data) else 207
+
 
-    # Validate request data
+def _bulk_update_by_filter(data):
     try:
-        schema = UserCreateSchema()
-        validated_data = schema.load(data)
+        validated = compiled(BulkFilterUpdateSchema).load(data)
     except ValidationError as err:
         return jsonify({"error": "Validation error", "details": err.messages}), 400
 
-    # 检查用户名是否已存在
-    existing_user = User.query.filter_by(username=validated_data["username"]).first()
-    if existing_user:
-        return jsonify({"error": "Username already exists"}), 400
+    # 单条集合UPDATE语句
+    updated = db.session.scalars(
+        db.update(User)
+        .where(_user_filter_clause(validated["filter"]))
+        .values(**validated["changes"])
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    user_cache.delete_many(updated)
+    return jsonify({"updated": sorted(updated), "missing": []})
+
 
-    user = User(username=validated_data["username"], email=validated_data["email"])
-    db.session.add(user)
+@api.route("/api/users/bulk", methods=["DELETE"])
+@api_doc(
+    "批量删除用户",
+    {200: ("删除结果", None), 400: ("请求参数错误", ErrorResponseSchema)},
+    request=BulkDeleteSchema,
+)
+def bulk_delete_users():
+    data = request.get_json()
+    try:
+        validated = compiled(BulkDeleteSchema).load(data)
+    except ValidationError as err:
+        return jsonify({"error": "Validation error", "details": err.messages}), 400
+
+    if "ids" in validated:
+        requested = set(validated["ids"])
+        max_items = current_app.config["USERS_BULK_MAX_ITEMS"]
+        if len(requested) > max_items:
+            return (
+                jsonify({"error": f"Too many items, at most {max_items} allowed"}),
+                400,
+            )
+        clause = User.id.in_(requested)
+    else:
+        requested = set()
+        clause = _user_filter_clause(validated["filter"])
+
+    # 单条集合DELETE语句，RETURNING 给出实际删除的ID
+    deleted = db.session.scalars(
+        db.delete(User)
+        .where(clause)
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    ).all()
     db.session.commit()
+    user_cache.delete_many(deleted)
 
-    # Return response with schema
-    response_schema = UserResponseSchema()
-    result = response_schema.dump(user)
-    return jsonify(result), 201
+    result = {
+        "deleted": sorted(deleted),
+        "missing": sorted(requested.difference(deleted)),
+    }
+    return jsonify(result)
 
 
-@app.route("/api/users/<int:user_id>", methods=["GET"])
+@api.route("/api/users/<int:user_id>", methods=["GET"])
+@api_doc(
+    "根据ID获取用户信息",
+    {
+        200: ("成功响应", UserResponseSchema),
+        304: ("内容未变化", None),
+        400: ("请求参数错误", ErrorResponseSchema),
+        404: ("用户不存在", None),
+    },
+    query=UserFieldsQuerySchema,
+)
 def get_user(user_id):
-    user = User.query.get_or_404(user_id)
-    schema = UserResponseSchema()
-    result = schema.dump(user)
-    return jsonify(result)
+    names = _requested_fields()
+    # 读穿缓存：未命中时查询数据库并缓存序列化结果
+    entry = user_cache.get(user_id)
+    if names is not None:
+        # 部分字段不写入缓存：命中时从完整表示中取字段，未命中时只查询需要的列
+        row = None
+        if entry is None:
+            statement = _user_fields_statement(user_id, names)
+            row = _found(db.session.execute(statement).first())
+        return _projected_user(user_id, names, entry, row)
+    if entry is None:
+        if request.if_none_match or request.if_modified_since:
+            # 只查版本列判断是否变化，命中304时无需加载和序列化整行
+            statement = _user_version_statement(user_id)
+            row = _found(db.session.execute(statement).first())
+            not_modified = _user_not_modified(user_id, row)
+            if not_modified:
+                return not_modified
+        # 读取前记下失效代数：读取期间有写入提交并失效时，读到的旧版本不写入缓存
+        generation = user_cache.generation(user_id)
+        user = User.query.get_or_404(user_id)
+        entry = _user_cache_entry(user)
+        user_cache.set(user_id, entry, generation)
+    return _cached_user_response(user_id, entry)
+
+
+def _requested_fields():
+    """单个用户接口的 fields 参数，不带该参数或请求全部字段时为 None"""
+    if "fields" not in request.args:
+        return None
+    query = _validated(UserFieldsQuerySchema, request.args, "invalid query parameter")
+    return query["field_names"]
+
+
+def _user_version_statement(user_id):
+    return db.select(User.version, User.updated_at).where(User.id == user_id)
+
+
+def _user_not_modified(user_id, row):
+    """row 为 _user_version_statement 的结果，版本未变化时返回304"""
+    return _not_modified(user_etag(user_id, row.version), row.updated_at)
+
+
+def _cached_user_response(user_id, entry):
+    """由缓存条目生成单个用户的响应，条件请求命中时返回304"""
+    updated_at = datetime.fromtimestamp(entry["updated_at"], timezone.utc)
+    not_modified = _not_modified(user_etag(user_id, entry["version"]), updated_at)
+    if not_modified:
+        return not_modified
+    response = jsonify(entry["data"])
+    return _set_user_validators(response, user_id, entry["version"], updated_at)
+
+
+def _user_fields_statement(user_id, names):
+    return db.select(*_user_columns(names, "version", "updated_at")).where(
+        User.id == user_id
+    )
 
 
-@app.route("/api/users/<int:user_id>", methods=["PUT"])
+def _projected_user(user_id, names, entry, row):
+    """部分字段的单个用户响应，entry 为缓存条目，未命中缓存时 row 为只含所需列的结果行"""
+    if entry is not None:
+        version = entry["version"]
+        updated_at = datetime.fromtimestamp(entry["updated_at"], timezone.utc)
+    else:
+        version, updated_at = row.version, row.updated_at
+    etag = user_etag(user_id, version, names)
+    not_modified = _not_modified(etag, updated_at)
+    if not_modified:
+        return not_modified
+    if entry is not None:
+        data = {name: entry["data"][name] for name in names}
+    else:
+        data = compiled(projected_schema(names)).dump(row)
+    response = jsonify(data)
+    return _set_user_validators(response, user_id, version, updated_at, names)
+
+
+@api.route("/api/users/cache/stats", methods=["GET"])
+@api_doc("用户缓存统计信息", {200: ("成功响应", None)})
+def user_cache_stats():
+    return jsonify(user_cache.stats())
+
+
+@api.route("/metrics", methods=["GET"])
+@api_doc("Prometheus 文本格式的运行指标", {200: ("成功响应（text/plain）", None)})
+def export_metrics():
+    return metrics.response()
+
+
+@api.route("/api/profiles/<filename>", methods=["GET"])
+@api_doc(
+    "下载性能分析结果，请求头 X-Profile 需携带分析令牌",
+    {
+        200: ("分析结果文件", None),
+        403: ("令牌错误", None),
+        404: ("未启用性能分析或文件不存在", None),
+    },
+)
+def download_profile(filename):
+    profiler = current_app.extensions.get("profiler")
+    if profiler is None:
+        abort(404)
+    return profiler.download(filename, request.headers.get("X-Profile"))
+
+
+@api.route("/api/users/<int:user_id>", methods=["PUT"])
+@api_doc(
+    "更新用户信息",
+    {
+        200: ("更新成功", UserResponseSchema),
+        400: ("请求参数错误", ErrorResponseSchema),
+        404: ("用户不存在", None),
+        412: ("If-Match 版本不匹配", ErrorResponseSchema),
+    },
+    request=UserUpdateSchema,
+)
 def update_user(user_id):
-    user = User.query.get_or_404(user_id)
-    data = request.get_json()
+    """单条 UPDATE ... RETURNING 完成更新，成功路径不需要额外读取
 
+    带 If-Match 时版本号作为UPDATE条件（乐观并发控制）；用户名冲突由唯一约束检查。
+    """
+    try:
+        validated_data = _update_data()
+    except HTTPException:
+        # 请求体无效时先确认用户存在：不存在的用户返回404，与校验前先查询时一致
+        if db.session.get(User, user_id) is None:
+            abort(404)
+        raise
+    statement = _update_statement(user_id, request.if_match, validated_data)
+    try:
+        user = db.session.scalars(statement).one_or_none()
+        if user is None:
+            db.session.rollback()
+            # 只有失败路径才需要区分“不存在”和“版本不匹配”
+            _update_failed(request.if_match and db.session.get(User, user_id))
+        response = _user_response(user)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return _username_taken()
+    user_cache.delete(user_id)
+    return response
+
+
+def _update_data():
+    data = request.get_json()
     if not data:
-        return jsonify({"error": "No data provided"}), 400
+        _abort_json(400, "No data provided")
+    return _validated(UserUpdateSchema, data)
+
+
+def _update_failed(user):
+    """UPDATE 没有匹配到行时中止请求
+
+    user 为带 If-Match 时按主键重新查到的用户：不存在返回404，存在说明版本不匹配，返回412。
+    """
+    if user is None or not request.if_match:
+        abort(404)
+    _abort_json(412, "Precondition failed")
+
+
+def _update_statement(user_id, if_match, values):
+    """更新单个用户的 UPDATE ... RETURNING 语句；If-Match 中的版本号作为条件，* 匹配任意版本
+
+    压缩后的响应带弱ETag，版本号相同即表示同一行版本，所以弱ETag也接受；
+    部分字段表示的ETag在版本号后附加了字段列表，同样按版本号匹配。
+    """
+    statement = db.update(User).where(User.id == user_id)
+    if if_match and not if_match.star_tag:
+        prefix = f"{user_id}-"
+        versions = []
+        for etag in if_match.as_set(include_weak=True):
+            version = etag[len(prefix) :].partition("-")[0]
+            if etag.startswith(prefix) and version.isdigit():
+                versions.append(int(version))
+        statement = statement.where(User.version.in_(versions))
+    return statement.values(**values).returning(User)
+
+
+@api.route("/api/users/by-username/<username>", methods=["PUT"])
+@api_doc(
+    "按用户名创建或更新用户（upsert）",
+    {
+        200: ("用户已存在，更新成功", UserResponseSchema),
+        201: ("用户创建成功", UserResponseSchema),
+        400: ("请求参数错误", ErrorResponseSchema),
+    },
+    request=UserUpsertSchema,
+)
+def upsert_user(username):
+    validated_data = _validated(UserUpsertSchema, request.get_json())
+    statement = _upsert_statement(username, validated_data["email"])
+    user = db.session.scalars(statement).one()
+    user_id, response = user.id, _upsert_response(user)
+    db.session.commit()
+    user_cache.delete(user_id)
+    return response
 
-    # Validate request data
-    try:
-        schema = UserUpdateSchema()
-        validated_data = schema.load(data)
-    except ValidationError as err:
-        return jsonify({"error": "Validation error", "details": err.messages}), 400
 
-    if "username" in validated_data:
-        # 检查新用户名是否与其他用户冲突
-        existing_user = User.query.filter_by(
-            username=validated_data["username"]
-        ).first()
-        if existing_user and existing_user.id != user_id:
-            return jsonify({"error": "Username already exists"}), 400
-        user.username = validated_data["username"]
+def _upsert_response(user):
+    # 新插入的行版本号为 1，冲突后更新的行版本号至少为 2
+    return _user_response(user, 201 if user.version == 1 else 200)
 
-    if "email" in validated_data:
-        user.email = validated_data["email"]
 
-    db.session.commit()
+def _upsert_statement(username, email):
+    """INSERT ... ON CONFLICT(username) DO UPDATE ... RETURNING，一条语句完成创建或更新
 
-    # Return response with schema
-    response_schema = UserResponseSchema()
-    result = response_schema.dump(user)
-    return jsonify(result)
+    ON CONFLICT 分支不会应用列的 onupdate，版本号和修改时间需要显式更新；
+    populate_existing 让会话中已有的同一用户对象也使用返回的新值。
+    """
+    statement = sqlite_insert(User).values(username=username, email=email)
+    statement = statement.on_conflict_do_update(
+        index_elements=[User.username],
+        set_={
+            "email": statement.excluded.email,
+            "version": User.version + 1,
+            "updated_at": utcnow(),
+        },
+    )
+    return statement.returning(User).execution_options(populate_existing=True)
 
 
 class DeleteResponseSchema(Schema):
@@ -958,22 +1458,330 @@ class DeleteResponseSchema(Schema):
     id = fields.Int(required=True)
 
 
-@app.route("/api/users/<int:user_id>", methods=["DELETE"])
+@api.route("/api/users/<int:user_id>", methods=["DELETE"])
+@api_doc(
+    "删除用户",
+    {200: ("删除成功", DeleteResponseSchema), 404: ("用户不存在", None)},
+)
 def delete_user(user_id):
     user = User.query.get_or_404(user_id)
     db.session.delete(user)
     db.session.commit()
+    user_cache.delete(user_id)
+    return _deleted_response(user_id)
+
 
-    # Return response with schema
-    schema = DeleteResponseSchema()
+def _deleted_response(user_id):
+    schema = compiled(DeleteResponseSchema)
     result = schema.dump({"message": "User deleted successfully", "id": user_id})
     return jsonify(result), 200
 
 
+# 异步（ASGI）运行模式：用户CRUD在异步引擎上以协程执行，不占用线程等待数据库，
+# 其余路由（以及NDJSON导出）交给Flask处理。响应格式、ETag和缓存与同步路径一致。
+# 异步引擎和会话工厂在 ASGI 服务器启动时创建，见 create_async_app
+async_engine = None
+async_session = None
+
+
+async def async_get_users(request):
+    if _wants_ndjson():
+        return None
+
+    page = _UserPage(request.args)
+    async with async_session() as session:
+        if request.if_none_match:
+            versions = (await session.execute(page.versions_statement)).all()
+            not_modified = page.not_modified(versions)
+            if not_modified:
+                return not_modified
+        rows = (await session.execute(page.statement)).all()
+    return page.response(rows)
+
+
+async def async_create_user(request):
+    validated_data = _validated(UserCreateSchema, request.get_json())
+    async with async_session() as session:
+        try:
+            user = await session.scalar(_insert_statement(validated_data))
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            return _username_taken()
+    user_cache.delete(user.id)
+    return _user_response(user, 201)
+
+
+async def async_get_user(request, user_id):
+    names = _requested_fields()
+    entry = user_cache.get(user_id)
+    if names is not None:
+        row = None
+        if entry is None:
+            async with async_session() as session:
+                statement = _user_fields_statement(user_id, names)
+                row = _found((await session.execute(statement)).first())
+        return _projected_user(user_id, names, entry, row)
+    if entry is None:
+        async with async_session() as session:
+            if request.if_none_match or request.if_modified_since:
+                statement = _user_version_statement(user_id)
+                row = _found((await session.execute(statement)).first())
+                not_modified = _user_not_modified(user_id, row)
+                if not_modified:
+                    return not_modified
+            generation = user_cache.generation(user_id)
+            user = _found(await session.get(User, user_id))
+            entry = _user_cache_entry(user)
+        user_cache.set(user_id, entry, generation)
+    return _cached_user_response(user_id, entry)
+
+
+async def async_update_user(request, user_id):
+    async with async_session() as session:
+        try:
+            validated_data = _update_data()
+        except HTTPException:
+            if await session.get(User, user_id) is None:
+                abort(404)
+            raise
+        statement = _update_statement(user_id, request.if_match, validated_data)
+        try:
+            user = await session.scalar(statement)
+            if user is None:
+                await session.rollback()
+                _update_failed(request.if_match and await session.get(User, user_id))
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            return _username_taken()
+    user_cache.delete(user_id)
+    return _user_response(user)
+
+
+async def async_upsert_user(request, username):
+    validated_data = _validated(UserUpsertSchema, request.get_json())
+    statement = _upsert_statement(username, validated_data["email"])
+    async with async_session() as session:
+        user = await session.scalar(statement)
+        await session.commit()
+    user_cache.delete(user.id)
+    return _upsert_response(user)
+
+
+async def async_delete_user(request, user_id):
+    async with async_session() as session:
+        user = _found(await session.get(User, user_id))
+        await session.delete(user)
+        await session.commit()
+    user_cache.delete(user_id)
+    return _deleted_response(user_id)
+
+
+def create_async_app(app):
+    """异步（ASGI）应用，协程处理函数在 app 的请求上下文中执行，共用 app 的请求钩子"""
+    from asgi_app import AsyncApp, create_async_session
+
+    async_app = AsyncApp(fallback=app)
+
+    @async_app.on_startup
+    async def open_async_database():
+        global async_engine, async_session
+        init_db(app)
+        with app.app_context():
+            async_engine, async_session = create_async_session(
+                db.engine,
+                app.config.get("SQLALCHEMY_ENGINE_OPTIONS"),
+                app.config["SQLITE_PRAGMAS"],
+                echo=app.config["SQLALCHEMY_ECHO"],
+            )
+        # 异步引擎上的查询同样计入请求的查询次数和耗时
+        metrics.instrument_engine(async_engine.sync_engine)
+
+    @async_app.on_shutdown
+    async def close_async_database():
+        await async_engine.dispose()
+
+    async_app.route("/api/users", methods=["GET"])(async_get_users)
+    async_app.route("/api/users", methods=["POST"])(async_create_user)
+    async_app.route("/api/users/<int:user_id>", methods=["GET"])(async_get_user)
+    async_app.route("/api/users/<int:user_id>", methods=["PUT"])(async_update_user)
+    async_app.route("/api/users/<int:user_id>", methods=["DELETE"])(async_delete_user)
+    async_app.route("/api/users/by-username/<username>", methods=["PUT"])(
+        async_upsert_user
+    )
+    return async_app
+
+
+def precompile_schemas():
+    """一次性编译各接口用到的 Schema，预派生模式下在主进程中执行，工作进程直接继承"""
+    for schema_class in (
+        MessageResponseSchema,
+        FrameworkResponseSchema,
+        MethodResponseSchema,
+        UserInfoSchema,
+        UserIdSchema,
+        UserFieldsQuerySchema,
+        UserListQuerySchema,
+        UserSearchQuerySchema,
+        UserStatsQuerySchema,
+        UserStatsSchema,
+        UserCreateSchema,
+        UserUpdateSchema,
+        UserUpsertSchema,
+        BulkUpdateItemSchema,
+        BulkFilterUpdateSchema,
+        BulkDeleteSchema,
+        UserResponseSchema,
+        DeleteResponseSchema,
+    ):
+        compiled(schema_class)
+    compiled(UserResponseSchema, many=True)
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Flask Demo Server")
+    parser.add_argument(
+        "--document",
+        type=str,
+        default="false",
+        help="Enable swagger documentation (true/false)",
+    )
+    parser.add_argument(
+        "--debug", type=str, default="false", help="Enable debug mode (true/false)"
+    )
+    parser.add_argument("--port", type=int, default=1999, help="Port to listen on")
+    parser.add_argument(
+        "--server",
+        choices=["dev", "production", "async"],
+        default="dev",
+        help="dev: Werkzeug development server; production: prefork multi-process "
+        "server; async: ASGI server with async user CRUD handlers",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes in production mode",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=4,
+        help="Number of threads per worker process in production mode",
+    )
+    parser.add_argument(
+        "--db-profile",
+        choices=sorted(PROFILES),
+        default="default",
+        help="Database performance profile (default/production)",
+    )
+    parser.add_argument(
+        "--database-uri",
+        type=str,
+        default="sqlite:///project.db",
+        help="SQLAlchemy database URI (relative SQLite paths are in the instance folder)",
+    )
+    parser.add_argument(
+        "--openapi-out",
+        type=str,
+        default=None,
+        help="Write the generated OpenAPI document to this path and exit",
+    )
+    parser.add_argument(
+        "--reconcile-stats",
+        action="store_true",
+        help="Recount the user statistics from the user table, print the drift "
+        "and exit (run periodically, e.g. from cron)",
+    )
+    return parser.parse_args(argv)
+
+
+def __getattr__(name):
+    # 兼容 main.app（以及 gunicorn main:app 等）：第一次访问时用默认配置创建应用
+    global app, async_app
+    if name == "app":
+        app = create_app()
+        return app
+    if name == "async_app":
+        async_app = create_async_app(__getattr__("app"))
+        return async_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def main():
+    args = parse_args()
+    config = {
+        "DB_PROFILE": args.db_profile,
+        "SQLALCHEMY_DATABASE_URI": args.database_uri,
+        "SWAGGER_ENABLED": args.document.lower() == "true",
+    }
+    if args.server == "production" and args.workers > 1:
+        # 现有的缓存后端都保存在进程内，写入只能失效处理它的工作进程中的条目，
+        # 其他工作进程会返回旧数据直到过期，所以多个工作进程时不使用缓存
+        config["USER_CACHE_BACKEND"] = "none"
+    app = create_app(config)
+    if args.openapi_out:
+        spec = build_spec(app, "flask-demo-project")
+        with open(args.openapi_out, "w", encoding="utf-8") as file:
+            json.dump(spec, file, ensure_ascii=False, indent=2)
+            file.write("\n")
+        return
+    if args.reconcile_stats:
+        init_db(app)
+        with app.app_context(), db.engine.begin() as connection:
+            drift = user_stats.reconcile(connection)
+        print(f"用户总数修正: {drift['total']:+d}")
+        for domain, change in sorted(drift["domains"].items()):
+            print(f"  {domain}: {change:+d}")
+        return
+
     debug_mode = True if args.debug.lower() == "true" else None
     print(args)
-    app.run(debug=debug_mode, port=args.port, host="0.0.0.0")
+    precompile_schemas()
+    # 由 file_watcher 蓝绿重载启动时继承监听套接字，准备好后通知它停止旧进程
+    from server import PreforkServer, inherited_fd, notify_ready
+
+    listen_fd = inherited_fd()
+    if args.server == "async":
+        from asgi_app import serve as serve_asgi
+
+        serve_asgi(
+            create_async_app(app),
+            host="0.0.0.0",
+            port=args.port,
+            fd=listen_fd,
+            ready=notify_ready,
+        )
+        return
+    # 在启动服务器（派生工作进程）之前建表，工作进程启动时不再访问数据库
+    init_db(app)
+    server = PreforkServer(
+        app,
+        host="0.0.0.0",
+        port=args.port,
+        workers=args.workers,
+        threads=args.threads,
+        post_fork=functools.partial(_reset_db_after_fork, app),
+        fd=listen_fd,
+        ready=notify_ready,
+    )
+    if args.server == "production":
+        server.run()
+    elif listen_fd is not None:
+        # 开发服务器收到 SIGTERM 会直接退出，这里改用单进程线程池服务器，
+        # 处理完在途请求再退出；代码重载由 file_watcher 负责
+        app.debug = bool(debug_mode)
+        server.serve(listen_fd, ready=notify_ready)
+    else:
+        app.run(debug=debug_mode, port=args.port, host="0.0.0.0")
+
+
+def _reset_db_after_fork(app):
+    """丢弃从父进程继承的数据库连接，工作进程在派生后各自建立连接"""
+    with app.app_context():
+        db.engine.dispose(close=False)
 
 
 if __name__ == "__main__":
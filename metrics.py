@@ -0,0 +1,320 @@
+"""Prometheus 文本格式的运行指标
+
+每个线程只写自己的分片（shard），记录请求时不加锁；只有新线程第一次记录、
+线程退出合并分片以及抓取 /metrics 时才需要锁。多进程部署时每个工作进程
+各自统计，抓取到的是处理该次请求的进程的数据。
+
+正在处理的请求的计时和查询计数保存在 contextvars 中：异步模式下同一线程上
+并发执行的多个请求各自独立，数据库事件在 SQLAlchemy 的 greenlet 中也能取到。
+"""
+
+import bisect
+import contextvars
+import threading
+import weakref
+from time import perf_counter
+
+from flask import Response, request
+from flask.json.provider import JSONProvider
+from sqlalchemy import event
+
+# 请求耗时直方图的桶（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+# 单个请求内数据库查询次数直方图的桶
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, size):
+        self.counts = [0] * (size + 1)  # 最后一个为 +Inf
+        self.sum = 0.0
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.sum += other.sum
+
+
+class _Shard:
+    """单个线程的计数器，只由所属线程写入"""
+
+    def __init__(self):
+        self.requests = {}  # (endpoint, method, status) -> 次数
+        self.errors = {}  # endpoint -> 5xx 次数
+        self.latency = {}  # endpoint -> _Histogram
+        self.query_counts = {}  # endpoint -> _Histogram
+        self.queries = {}  # endpoint -> 查询次数
+        self.query_time = {}  # endpoint -> 查询耗时
+        self.serialization = {}  # endpoint -> 序列化耗时
+
+    def merge(self, other):
+        for name in ("requests", "errors", "queries", "query_time", "serialization"):
+            target = getattr(self, name)
+            for key, value in getattr(other, name).copy().items():
+                target[key] = target.get(key, 0) + value
+        for name, size in (
+            ("latency", len(LATENCY_BUCKETS)),
+            ("query_counts", len(QUERY_COUNT_BUCKETS)),
+        ):
+            target = getattr(self, name)
+            for key, histogram in getattr(other, name).copy().items():
+                target.setdefault(key, _Histogram(size)).merge(histogram)
+
+
+class _RequestStats:
+    """正在处理的单个请求的计时和查询计数"""
+
+    __slots__ = ("started", "query_started", "queries", "query_time", "serialization")
+
+    def __init__(self, started):
+        self.started = started
+        self.query_started = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+        self.serialization = 0.0
+
+
+# 当前请求的统计，不在请求中时为 None
+_current_request = contextvars.ContextVar("metrics_request", default=None)
+
+
+def _observe(histograms, key, buckets, value):
+    histogram = histograms.get(key)
+    if histogram is None:
+        histogram = histograms[key] = _Histogram(len(buckets))
+    histogram.counts[bisect.bisect_left(buckets, value)] += 1
+    histogram.sum += value
+
+
+class Metrics:
+    def __init__(self, app=None, db=None):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = set()
+        self._retired = _Shard()  # 已退出线程的计数
+        self.db = db
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db=None):
+        self.db = db or self.db
+        app.extensions["metrics"] = self
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.json = TimedJSONProvider(app, app.json, self)
+        if self.db is not None:
+            with app.app_context():
+                self.instrument_engine(self.db.engine)
+
+    def instrument_engine(self, engine):
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.add(shard)
+            # 线程退出时把分片合并进 _retired，避免每个请求一个线程时分片无限增长
+            weakref.finalize(threading.current_thread(), self._retire, shard)
+            return shard
+
+    def _retire(self, shard):
+        with self._lock:
+            self._shards.discard(shard)
+            self._retired.merge(shard)
+
+    def before_request(self):
+        _current_request.set(_RequestStats(perf_counter()))
+
+    def after_request(self, response):
+        stats = _current_request.get()
+        if stats is None:
+            return response
+        elapsed = perf_counter() - stats.started
+        _current_request.set(None)
+        shard = self.shard()
+        endpoint = request.endpoint or "unmatched"
+        key = (endpoint, request.method, response.status_code)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+        if response.status_code >= 500:
+            shard.errors[endpoint] = shard.errors.get(endpoint, 0) + 1
+        _observe(shard.latency, endpoint, LATENCY_BUCKETS, elapsed)
+        _observe(shard.query_counts, endpoint, QUERY_COUNT_BUCKETS, stats.queries)
+        shard.queries[endpoint] = shard.queries.get(endpoint, 0) + stats.queries
+        shard.query_time[endpoint] = (
+            shard.query_time.get(endpoint, 0.0) + stats.query_time
+        )
+        shard.serialization[endpoint] = (
+            shard.serialization.get(endpoint, 0.0) + stats.serialization
+        )
+        return response
+
+    def _before_cursor_execute(self, *args):
+        stats = _current_request.get()
+        if stats is not None:
+            stats.query_started = perf_counter()
+
+    def _after_cursor_execute(self, *args):
+        stats = _current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_time += perf_counter() - stats.query_started
+
+    def add_serialization(self, seconds):
+        stats = _current_request.get()
+        if stats is not None:
+            stats.serialization += seconds
+
+    def timed(self, schema):
+        """包装已编译的 Schema，dump 耗时计入当前请求的序列化时间"""
+        return TimedSchema(schema, self)
+
+    def collect(self):
+        """合并所有线程的分片"""
+        total = _Shard()
+        with self._lock:
+            total.merge(self._retired)
+            for shard in self._shards:
+                total.merge(shard)
+        return total
+
+    def render(self):
+        total = self.collect()
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        family(
+            "http_requests_total", "counter", "HTTP requests by endpoint and status."
+        )
+        for (endpoint, method, status), value in sorted(total.requests.items()):
+            labels = _labels(endpoint=endpoint, method=method, status=status)
+            lines.append(f"http_requests_total{labels} {value}")
+
+        family("http_request_errors_total", "counter", "HTTP 5xx responses.")
+        for endpoint, value in sorted(total.errors.items()):
+            lines.append(
+                f"http_request_errors_total{_labels(endpoint=endpoint)} {value}"
+            )
+
+        family("http_request_duration_seconds", "histogram", "HTTP request latency.")
+        _render_histogram(
+            lines, "http_request_duration_seconds", total.latency, LATENCY_BUCKETS
+        )
+
+        family("db_queries_per_request", "histogram", "Database queries per request.")
+        _render_histogram(
+            lines, "db_queries_per_request", total.query_counts, QUERY_COUNT_BUCKETS
+        )
+
+        for name, values, help_text in (
+            ("db_queries_total", total.queries, "Database queries."),
+            (
+                "db_query_seconds_total",
+                total.query_time,
+                "Time spent executing database queries.",
+            ),
+            (
+                "serialization_seconds_total",
+                total.serialization,
+                "Time spent dumping schemas and encoding JSON.",
+            ),
+        ):
+            family(name, "counter", help_text)
+            for endpoint, value in sorted(values.items()):
+                lines.append(f"{name}{_labels(endpoint=endpoint)} {value}")
+
+        if self.db is not None:
+            pool = self.db.engine.pool
+            for name, method, help_text in (
+                ("db_pool_size", "size", "Configured connection pool size."),
+                ("db_pool_checked_out", "checkedout", "Connections in use."),
+                ("db_pool_checked_in", "checkedin", "Idle pooled connections."),
+                ("db_pool_overflow", "overflow", "Connections above pool size."),
+            ):
+                if hasattr(pool, method):
+                    # QueuePool 未建满连接时 overflow() 为负数
+                    family(name, "gauge", help_text)
+                    lines.append(f"{name} {max(getattr(pool, method)(), 0)}")
+
+        lines.append("")
+        return "\n".join(lines)
+
+    def response(self):
+        return Response(self.render(), content_type=CONTENT_TYPE)
+
+
+class TimedSchema:
+    """已编译 Schema 的包装，只统计 dump 耗时"""
+
+    def __init__(self, schema, metrics):
+        self.schema = schema
+        self.metrics = metrics
+        self.load = schema.load
+
+    def dump(self, obj, *, many=None):
+        started = perf_counter()
+        try:
+            return self.schema.dump(obj, many=many)
+        finally:
+            self.metrics.add_serialization(perf_counter() - started)
+
+
+class TimedJSONProvider(JSONProvider):
+    """包装应用原有的 JSON 编码器，编码耗时计入当前请求的序列化时间"""
+
+    def __init__(self, app, provider, metrics):
+        super().__init__(app)
+        self.provider = provider
+        self.metrics = metrics
+
+    def __getattr__(self, name):
+        # sort_keys、compact 等属性读取原编码器的设置
+        return getattr(self.provider, name)
+
+    def dumps(self, obj, **kwargs):
+        started = perf_counter()
+        try:
+            return self.provider.dumps(obj, **kwargs)
+        finally:
+            self.metrics.add_serialization(perf_counter() - started)
+
+    def loads(self, s, **kwargs):
+        return self.provider.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        started = perf_counter()
+        try:
+            return self.provider.response(*args, **kwargs)
+        finally:
+            self.metrics.add_serialization(perf_counter() - started)
+
+
+def _labels(**labels):
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _render_histogram(lines, name, histograms, buckets):
+    for endpoint, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(buckets + ("+Inf",), histogram.counts):
+            cumulative += count
+            labels = _labels(endpoint=endpoint, le=bound)
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _labels(endpoint=endpoint)
+        lines.append(f"{name}_sum{labels} {histogram.sum}")
+        lines.append(f"{name}_count{labels} {cumulative}")
@@ -0,0 +1,219 @@
+import gzip
+import hashlib
+import json
+import re
+
+from flask import Response
+from marshmallow import Schema, fields, validate
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖
+    brotli = None
+
+
+# marshmallow 字段到 JSON Schema 类型的映射，子类要排在父类前面
+FIELD_TYPES = [
+    (fields.Email, {"type": "string", "format": "email"}),
+    (fields.String, {"type": "string"}),
+    (fields.Integer, {"type": "integer"}),
+    (fields.Float, {"type": "number"}),
+    (fields.Boolean, {"type": "boolean"}),
+    (fields.DateTime, {"type": "string", "format": "date-time"}),
+    (fields.Dict, {"type": "object"}),
+]
+
+# 路由转换器到路径参数类型的映射
+CONVERTER_TYPES = {
+    "int": {"type": "integer"},
+    "float": {"type": "number"},
+}
+
+RULE_ARGUMENT = re.compile(r"<(?:(?P<converter>[^:<>]+):)?(?P<name>[^<>]+)>")
+
+
+def api_doc(summary, responses, request=None, query=None, description=""):
+    """给视图函数附加接口文档，生成 OpenAPI 文档时读取
+
+    responses 形如 {状态码: (描述, Schema或None)}；request 可以是 Schema
+    或 Schema 列表（多种请求体格式）；query 为描述查询参数的 Schema。
+    """
+
+    def decorator(view):
+        view.api_doc = {
+            "summary": summary,
+            "description": description,
+            "request": request,
+            "query": query,
+            "responses": responses,
+        }
+        return view
+
+    return decorator
+
+
+class SpecBuilder:
+    """根据路由表和 marshmallow Schema 生成 OpenAPI 3.1 文档"""
+
+    def __init__(self, app, title, version):
+        self.app = app
+        self.title = title
+        self.version = version
+        self.components = {}
+
+    def build(self):
+        paths = {}
+        for rule in self.app.url_map.iter_rules():
+            view = self.app.view_functions.get(rule.endpoint)
+            doc = getattr(view, "api_doc", None)
+            if doc is None:
+                continue
+            path = RULE_ARGUMENT.sub(r"{\g<name>}", rule.rule)
+            operations = paths.setdefault(path, {})
+            for method in sorted(rule.methods - {"HEAD", "OPTIONS"}):
+                operations[method.lower()] = self.operation(rule, doc)
+        return {
+            "openapi": "3.1.0",
+            "info": {"title": self.title, "description": "", "version": self.version},
+            "paths": paths,
+            "components": {"schemas": dict(sorted(self.components.items()))},
+        }
+
+    def operation(self, rule, doc):
+        parameters = [
+            {
+                "name": match["name"],
+                "in": "path",
+                "required": True,
+                "schema": CONVERTER_TYPES.get(match["converter"], {"type": "string"}),
+            }
+            for match in RULE_ARGUMENT.finditer(rule.rule)
+        ]
+        if doc["query"] is not None:
+            for name, field in _schema_fields(doc["query"]).items():
+                parameters.append(
+                    {
+                        "name": field.data_key or name,
+                        "in": "query",
+                        "required": field.required,
+                        "schema": self.field_schema(field),
+                    }
+                )
+
+        operation = {
+            "summary": doc["summary"],
+            "description": doc["description"],
+            "parameters": parameters,
+            "responses": {},
+        }
+        if doc["request"] is not None:
+            requests = doc["request"]
+            if isinstance(requests, (list, tuple)):
+                body = {"oneOf": [self.schema_ref(schema) for schema in requests]}
+            else:
+                body = self.schema_ref(requests)
+            operation["requestBody"] = {
+                "required": True,
+                "content": {"application/json": {"schema": body}},
+            }
+        for status, (description, schema) in doc["responses"].items():
+            body = {"type": "object"} if schema is None else self.schema_ref(schema)
+            operation["responses"][str(status)] = {
+                "description": description,
+                "content": {"application/json": {"schema": body}},
+            }
+        return operation
+
+    def schema_ref(self, schema):
+        """把 Schema 注册到 components 并返回引用，many=True 时返回数组"""
+        schema_class = schema if isinstance(schema, type) else type(schema)
+        name = schema_class.__name__.removesuffix("Schema")
+        if name not in self.components:
+            self.components[name] = {}  # 先占位，防止嵌套 Schema 递归
+            self.components[name] = self.object_schema(schema_class)
+        ref = {"$ref": f"#/components/schemas/{name}"}
+        if isinstance(schema, Schema) and schema.many:
+            return {"type": "array", "items": ref}
+        return ref
+
+    def object_schema(self, schema_class):
+        properties = {}
+        required = []
+        for name, field in _schema_fields(schema_class).items():
+            key = field.data_key or name
+            properties[key] = self.field_schema(field)
+            if field.required:
+                required.append(key)
+        result = {"type": "object", "properties": properties}
+        if required:
+            result["required"] = required
+        return result
+
+    def field_schema(self, field):
+        if isinstance(field, fields.List):
+            result = {"type": "array", "items": self.field_schema(field.inner)}
+        elif isinstance(field, fields.Nested):
+            result = self.schema_ref(field.schema)
+        else:
+            result = next(
+                (
+                    dict(json_type)
+                    for field_class, json_type in FIELD_TYPES
+                    if isinstance(field, field_class)
+                ),
+                {},
+            )
+        for validator in field.validators:
+            if isinstance(validator, validate.Range):
+                if validator.min is not None:
+                    result["minimum"] = validator.min
+                if validator.max is not None:
+                    result["maximum"] = validator.max
+            elif isinstance(validator, validate.Length) and validator.min is not None:
+                result["minLength"] = validator.min
+        return result
+
+
+def _schema_fields(schema):
+    instance = schema() if isinstance(schema, type) else schema
+    return instance.fields
+
+
+def build_spec(app, title, version="1.0.0"):
+    return SpecBuilder(app, title, version).build()
+
+
+class OpenAPIDocument:
+    """启动时编码一次的 OpenAPI 文档，同时保存 gzip/br 压缩版本"""
+
+    max_age = 86400
+
+    def __init__(self, spec):
+        self.spec = spec
+        body = json.dumps(spec, ensure_ascii=False, separators=(",", ":"))
+        self.variants = {"identity": body.encode("utf-8")}
+        self.variants["gzip"] = gzip.compress(
+            self.variants["identity"], compresslevel=9, mtime=0
+        )
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(self.variants["identity"])
+        self.etag = hashlib.sha256(self.variants["identity"]).hexdigest()[:32]
+
+    def response(self, request):
+        """按 Accept-Encoding 返回预编码的字节，支持 If-None-Match"""
+        if request.if_none_match.contains_weak(self.etag):
+            response = Response(status=304)
+        else:
+            encoding = request.accept_encodings.best_match(
+                [name for name in ("br", "gzip") if name in self.variants],
+                default="identity",
+            )
+            response = Response(self.variants[encoding], mimetype="application/json")
+            if encoding != "identity":
+                response.headers["Content-Encoding"] = encoding
+        # 各编码版本内容等价，使用弱ETag
+        response.set_etag(self.etag, weak=True)
+        response.headers["Vary"] = "Accept-Encoding"
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response
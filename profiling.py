@@ -0,0 +1,224 @@
+"""按需的单请求性能分析
+
+请求头 ``X-Profile`` 携带正确的令牌时，只对这一个请求启用分析器，
+其他请求除了读取一次请求头外没有额外开销。``X-Profile-Mode`` 选择分析器：
+
+- ``cprofile``（默认）：确定性分析，生成 ``.prof``（pstats 格式）和 ``.txt`` 摘要
+- ``sample``：采样分析，按固定间隔抓取请求线程的调用栈，生成 ``.folded``
+  （可直接用于火焰图工具），对被分析请求本身的影响更小
+
+Python 3.12 起 cProfile 基于 ``sys.monitoring``，一个进程中同时只能有一个启用的
+cProfile 分析器；已有请求在用 cProfile 时，并发的分析请求改用采样分析。响应头
+``X-Profile-Mode`` 给出实际使用的分析器。
+
+同时记录该请求执行的 SQL 语句和耗时（``.sql.json``）。响应头 ``X-Profile-Id``
+给出文件名前缀，文件写入 PROFILING_DIR。
+"""
+
+import collections
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import uuid
+from datetime import datetime
+from time import perf_counter
+
+from flask import abort, send_from_directory
+from sqlalchemy import event
+
+PROFILE_MODES = ("cprofile", "sample")
+
+# 持有者正在使用 cProfile；多线程服务器上并发的分析请求不能同时启用
+_cprofile_lock = threading.Lock()
+
+
+class Sampler:
+    """在后台线程中定期采样目标线程的调用栈"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                filename = os.path.basename(code.co_filename)
+                stack.append(f"{code.co_name} ({filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+
+class RequestProfiler:
+    """包装 app.wsgi_app 的中间件"""
+
+    def __init__(self, app=None, db=None):
+        self.app = None
+        self.engine = None
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db=None):
+        self.app = app
+        if db is not None:
+            with app.app_context():
+                self.engine = db.engine
+        self.wsgi_app = app.wsgi_app
+        app.wsgi_app = self
+        app.extensions["profiler"] = self
+
+    @property
+    def directory(self):
+        return self.app.config["PROFILING_DIR"]
+
+    def authorized(self, token):
+        config = self.app.config
+        expected = config.get("PROFILING_TOKEN")
+        if not config.get("PROFILING_ENABLED") or not expected or token is None:
+            return False
+        return hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8"))
+
+    def __call__(self, environ, start_response):
+        token = environ.get("HTTP_X_PROFILE")
+        if token is None or not self.authorized(token):
+            return self.wsgi_app(environ, start_response)
+        return self.profile(environ, start_response)
+
+    def profile(self, environ, start_response):
+        mode = environ.get("HTTP_X_PROFILE_MODE", "cprofile").lower()
+        if mode not in PROFILE_MODES:
+            mode = "cprofile"
+        thread_id = threading.get_ident()
+        statements = []
+        query_started = 0.0
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+            nonlocal query_started
+            if threading.get_ident() == thread_id:
+                query_started = perf_counter()
+
+        def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+            if threading.get_ident() == thread_id:
+                statements.append(
+                    {
+                        "statement": statement,
+                        "parameters": repr(parameters)[:500],
+                        "executemany": many,
+                        "duration_ms": (perf_counter() - query_started) * 1000,
+                    }
+                )
+
+        captured = []
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return lambda data: None
+
+        # 只在分析期间挂上SQL事件，并按线程过滤，其他请求的语句不会混入
+        if self.engine is not None:
+            event.listen(self.engine, "before_cursor_execute", before_cursor_execute)
+            event.listen(self.engine, "after_cursor_execute", after_cursor_execute)
+        if mode == "cprofile" and not _cprofile_lock.acquire(blocking=False):
+            mode = "sample"
+        if mode == "sample":
+            profiler = Sampler(thread_id, self.app.config["PROFILING_SAMPLE_INTERVAL"])
+        else:
+            profiler = cProfile.Profile()
+        started = perf_counter()
+        try:
+            if mode == "sample":
+                profiler.start()
+            else:
+                profiler.enable()
+            iterable = self.wsgi_app(environ, capture)
+            try:
+                # 流式响应也在分析范围内生成完毕
+                body = b"".join(iterable)
+            finally:
+                if hasattr(iterable, "close"):
+                    iterable.close()
+        finally:
+            elapsed = perf_counter() - started
+            if mode == "sample":
+                profiler.stop()
+            else:
+                profiler.disable()
+                _cprofile_lock.release()
+            if self.engine is not None:
+                event.remove(
+                    self.engine, "before_cursor_execute", before_cursor_execute
+                )
+                event.remove(self.engine, "after_cursor_execute", after_cursor_execute)
+
+        status, headers, exc_info = captured
+        name = self.save(environ, mode, profiler, statements, status, elapsed)
+        headers = list(headers) + [("X-Profile-Id", name), ("X-Profile-Mode", mode)]
+        start_response(status, headers, exc_info)
+        return [body]
+
+    def save(self, environ, mode, profiler, statements, status, elapsed):
+        """写入分析结果，返回文件名前缀"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = environ.get("PATH_INFO", "").strip("/") or "index"
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", path)[:60]
+        name = (
+            f"{datetime.now():%Y%m%dT%H%M%S}-{environ['REQUEST_METHOD']}-{slug}-"
+            f"{uuid.uuid4().hex[:8]}"
+        )
+        prefix = os.path.join(self.directory, name)
+
+        if mode == "sample":
+            with open(f"{prefix}.folded", "w", encoding="utf-8") as file:
+                file.write(profiler.folded())
+        else:
+            profiler.dump_stats(f"{prefix}.prof")
+            summary = io.StringIO()
+            stats = pstats.Stats(profiler, stream=summary)
+            stats.sort_stats("cumulative").print_stats(40)
+            with open(f"{prefix}.txt", "w", encoding="utf-8") as file:
+                file.write(summary.getvalue())
+
+        report = {
+            "method": environ["REQUEST_METHOD"],
+            "path": environ.get("PATH_INFO", ""),
+            "query": environ.get("QUERY_STRING", ""),
+            "status": status,
+            "mode": mode,
+            "elapsed_ms": elapsed * 1000,
+            "sql_count": len(statements),
+            "sql_ms": sum(item["duration_ms"] for item in statements),
+            "statements": statements,
+        }
+        with open(f"{prefix}.sql.json", "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        return name
+
+    def download(self, filename, token):
+        """下载分析结果，需要与触发分析相同的令牌"""
+        if not self.app.config.get("PROFILING_ENABLED"):
+            abort(404)
+        if not self.authorized(token):
+            abort(403)
+        return send_from_directory(self.directory, filename, as_attachment=True)
@@ -0,0 +1,216 @@
+"""预派生（prefork）多进程生产服务器
+
+父进程创建监听套接字后派生多个工作进程，工作进程共享同一个套接字，
+各自用固定大小的线程池处理请求。父进程负责重启崩溃的工作进程，
+收到 SIGTERM/SIGINT 时通知所有工作进程处理完在途请求后退出。
+
+由 file_watcher 的蓝绿重载启动时，监听套接字从环境变量 LISTEN_FD 继承，
+开始接受连接后通过 READY_FD 管道通知 file_watcher，见 inherited_fd/notify_ready。
+"""
+
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer
+
+# 工作进程在启动后这么短的时间内退出视为启动失败，重启前等待，避免反复派生
+MIN_WORKER_LIFETIME = 1.0
+
+
+def inherited_fd():
+    """父进程传入的监听套接字描述符（环境变量 LISTEN_FD），没有时返回 None"""
+    fd = os.environ.get("LISTEN_FD")
+    return None if fd is None else int(fd)
+
+
+def notify_ready():
+    """已经开始接受连接，写入 READY_FD 管道通知父进程；只通知一次"""
+    fd = os.environ.pop("READY_FD", None)
+    if fd is None:
+        return
+    try:
+        os.write(int(fd), b"ready\n")
+        os.close(int(fd))
+    except OSError:
+        pass  # 父进程已经不再等待
+
+
+class ThreadPoolWSGIServer(BaseWSGIServer):
+    """用固定大小线程池处理连接的 WSGI 服务器"""
+
+    multithread = True
+    multiprocess = True
+
+    def __init__(self, host, port, app, threads=4, fd=None):
+        # 父类构造过程中会调用 server_close()，线程池要先创建
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        super().__init__(host, port, app, fd=fd)
+        # 多个进程共享监听套接字时，select 报告可读后连接可能已被其他进程取走，
+        # 阻塞的 accept 会一直等到下一个连接，期间也无法响应停止信号；
+        # 非阻塞时 accept 抛出的 BlockingIOError 由 socketserver 忽略
+        self.socket.setblocking(False)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def serve_forever(self, poll_interval=0.5):
+        try:
+            super().serve_forever(poll_interval)
+        finally:
+            # 停止接受新连接后，等待在途请求处理完成
+            self.executor.shutdown(wait=True)
+
+
+class PreforkServer:
+    def __init__(
+        self,
+        app,
+        host="0.0.0.0",
+        port=1999,
+        workers=2,
+        threads=4,
+        post_fork=None,
+        graceful_timeout=30.0,
+        fd=None,
+        ready=None,
+    ):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.post_fork = post_fork
+        self.graceful_timeout = graceful_timeout
+        self.fd = fd  # 继承的监听套接字，不再自己绑定端口
+        self.ready = ready  # 工作进程全部派生后调用
+        self.socket = None
+        self.children = {}
+        self.stopping = False
+
+    def run(self):
+        if not hasattr(os, "fork"):
+            # 没有 fork 的平台（Windows）退化为单进程线程池服务器
+            print("当前平台不支持 fork，以单进程模式运行")
+            self.serve(self.fd, ready=self.ready)
+            return
+
+        if self.fd is None:
+            self.socket = self.create_socket()
+        else:
+            self.socket = socket.socket(fileno=self.fd)
+            self.socket.set_inheritable(True)
+        print(
+            f"监听 {self.host}:{self.port}，"
+            f"{self.workers} 个工作进程 x {self.threads} 个线程"
+        )
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        for _ in range(self.workers):
+            self.spawn()
+        if self.ready is not None:
+            self.ready()
+
+        while not self.stopping:
+            # 轮询而不是阻塞在 os.wait()，信号处理后系统调用会被自动重试
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                time.sleep(0.2)
+                continue
+            started = self.children.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            print(f"工作进程 {pid} 异常退出（状态 {status}），重新启动")
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                time.sleep(MIN_WORKER_LIFETIME)
+            self.spawn()
+
+        self.stop_children()
+        self.socket.close()
+
+    def create_socket(self):
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(socket.SOMAXCONN)
+        sock.set_inheritable(True)
+        return sock
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return pid
+
+        # 子进程
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)  # 由父进程统一转发停止信号
+            if self.post_fork is not None:
+                self.post_fork()
+            self.serve(self.socket.fileno())
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    def serve(self, fd, ready=None):
+        """在当前进程中服务，收到 SIGTERM 时处理完在途请求再返回"""
+        server = ThreadPoolWSGIServer(
+            self.host, self.port, self.app, threads=self.threads, fd=fd
+        )
+
+        def graceful_stop(signum, frame):
+            # shutdown() 会等待 serve_forever 退出，不能在同一线程中调用
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, graceful_stop)
+        if ready is not None:
+            ready()
+        server.serve_forever()
+
+    def handle_stop(self, signum, frame):
+        self.stopping = True
+
+    def stop_children(self):
+        """通知所有工作进程优雅退出，超时后强制结束"""
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self.children.pop(pid, None)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.children and time.monotonic() < deadline:
+            for pid in list(self.children):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    self.children.pop(pid, None)
+            time.sleep(0.05)
+        for pid in self.children:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.children.clear()
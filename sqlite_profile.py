@@ -0,0 +1,57 @@
+from sqlalchemy import event
+
+# 数据库性能配置档：default 保持原有的开发行为，production 面向并发读写
+PROFILES = {
+    "default": {
+        "config": {
+            "SQLALCHEMY_ECHO": True,
+            "SQLALCHEMY_TRACK_MODIFICATIONS": True,
+        },
+        "pragmas": {},
+    },
+    "production": {
+        "config": {
+            "SQLALCHEMY_ECHO": False,
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+            "SQLALCHEMY_ENGINE_OPTIONS": {
+                "pool_size": 10,
+                "max_overflow": 20,
+                "pool_timeout": 30,
+                "connect_args": {"timeout": 30, "check_same_thread": False},
+            },
+        },
+        # 每个新建的连接都会执行，顺序即执行顺序
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,
+            "cache_size": -64000,  # 负数单位为KiB，即64MB
+            "mmap_size": 268435456,  # 256MB
+            "temp_store": "MEMORY",
+        },
+    },
+}
+
+
+def apply_profile(app, name):
+    """把配置档写入 app.config，需在 db.init_app 之前调用"""
+    try:
+        profile = PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown database profile: {name}")
+    app.config["DB_PROFILE"] = name
+    app.config.update(profile["config"])
+    app.config["SQLITE_PRAGMAS"] = dict(profile["pragmas"])
+
+
+def register_pragmas(engine, pragmas):
+    """在连接池的每个新连接上执行 PRAGMA"""
+    if not pragmas or engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
@@ -0,0 +1,153 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# 失效代数按键的哈希分到固定数量的槽中，内存占用与键的数量无关
+GENERATION_SLOTS = 1024
+
+
+class LRUCache:
+    """进程内LRU缓存，带容量上限和TTL"""
+
+    backend = "lru"
+
+    def __init__(self, max_size=10000, ttl=60.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_fills = 0
+        self._generations = [0] * GENERATION_SLOTS
+
+    def generation(self, key):
+        """读数据库之前取得键的失效代数，传给 set
+
+        读取期间该键被失效过（并发写入已提交）时 set 不写入，读到的旧版本不会进入缓存。
+        同一个槽中其他键的失效也会使这次写入被跳过，只影响命中率，不影响正确性。
+        """
+        return self._generations[hash(key) % GENERATION_SLOTS]
+
+    def get(self, key):
+        """返回缓存值，未命中或已过期时返回None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._decode(value)
+
+    def set(self, key, value, generation=None):
+        """写入缓存，超出容量时淘汰最久未使用的条目
+
+        generation 为读数据库之前 generation() 的返回值，此后该键被失效过时放弃写入。
+        """
+        entry = (self._encode(value), self._clock() + self.ttl)
+        with self._lock:
+            if (
+                generation is not None
+                and self._generations[hash(key) % GENERATION_SLOTS] != generation
+            ):
+                self.stale_fills += 1
+                return
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """精确失效单个条目"""
+        self.delete_many((key,))
+
+    def delete_many(self, keys):
+        """精确失效多个条目；缓存中还没有的键同样推进失效代数，阻止正在进行的回填"""
+        with self._lock:
+            for key in keys:
+                self._generations[hash(key) % GENERATION_SLOTS] += 1
+                if self._data.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """返回命中、未命中和淘汰计数，用于评估缓存容量"""
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_fills": self.stale_fills,
+            }
+
+    def _encode(self, value):
+        return value
+
+    def _decode(self, value):
+        return value
+
+
+class LocalSharedCache(LRUCache):
+    """共享缓存（如Redis）的本地替身
+
+    值以JSON文本存储，每次读取都得到新的副本，行为与跨进程共享的缓存一致。
+    """
+
+    backend = "shared"
+
+    def _encode(self, value):
+        return json.dumps(value, separators=(",", ":"))
+
+    def _decode(self, value):
+        return json.loads(value)
+
+
+class NullCache(LRUCache):
+    """不缓存任何内容，只统计未命中次数"""
+
+    backend = "none"
+
+    def set(self, key, value, generation=None):
+        pass
+
+
+CACHE_BACKENDS = {
+    "lru": LRUCache,
+    "shared": LocalSharedCache,
+    "none": NullCache,
+}
+
+
+def create_user_cache(config):
+    """根据配置创建用户缓存"""
+    backend = config.get("USER_CACHE_BACKEND", "lru")
+    try:
+        cache_class = CACHE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown user cache backend: {backend}")
+    return cache_class(
+        max_size=config.get("USER_CACHE_MAX_SIZE", 10000),
+        ttl=config.get("USER_CACHE_TTL", 60.0),
+    )
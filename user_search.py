@@ -0,0 +1,73 @@
+"""用户搜索：FTS5 全文索引和用户名前缀范围
+
+user_fts 是以 user 表为外部内容（external content）的 FTS5 虚拟表，只保存倒排索引，
+不重复存储用户名和邮箱。user 表上的触发器在插入、更新、删除时同步索引，
+ORM、批量语句和异步引擎的写入都不需要额外处理。
+"""
+
+from sqlalchemy import column, table
+
+# 只用于构造查询，不属于 metadata，create_all 不会把它当作普通表创建
+user_fts = table("user_fts", column("rowid"), column("user_fts"))
+
+SEARCH_INDEX_DDL = (
+    # prefix='2 3'：为 2、3 个字符的前缀单独建索引，短前缀查询不必扫描整个词表
+    "CREATE VIRTUAL TABLE IF NOT EXISTS user_fts USING fts5("
+    "username, email, content='user', content_rowid='id', prefix='2 3')",
+    """CREATE TRIGGER IF NOT EXISTS user_fts_insert AFTER INSERT ON user BEGIN
+        INSERT INTO user_fts(rowid, username, email)
+        VALUES (new.id, new.username, new.email);
+    END""",
+    # 外部内容表删除索引项时必须提供旧值
+    """CREATE TRIGGER IF NOT EXISTS user_fts_delete AFTER DELETE ON user BEGIN
+        INSERT INTO user_fts(user_fts, rowid, username, email)
+        VALUES ('delete', old.id, old.username, old.email);
+    END""",
+    # 只改 version、updated_at 的更新不触碰索引
+    """CREATE TRIGGER IF NOT EXISTS user_fts_update
+    AFTER UPDATE OF username, email ON user BEGIN
+        INSERT INTO user_fts(user_fts, rowid, username, email)
+        VALUES ('delete', old.id, old.username, old.email);
+        INSERT INTO user_fts(rowid, username, email)
+        VALUES (new.id, new.username, new.email);
+    END""",
+)
+
+
+def install(connection):
+    """创建全文索引和同步触发器；索引是新建的时从 user 表重建内容"""
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_fts'"
+    ).first()
+    for statement in SEARCH_INDEX_DDL:
+        connection.exec_driver_sql(statement)
+    if not exists:
+        connection.exec_driver_sql("INSERT INTO user_fts(user_fts) VALUES ('rebuild')")
+
+
+def drop(connection):
+    """删除全文索引（触发器随 user 表一起删除）"""
+    connection.exec_driver_sql("DROP TABLE IF EXISTS user_fts")
+
+
+def match_expression(text):
+    """把用户输入转换为 FTS5 查询：每个词按前缀匹配，词之间为 AND
+
+    每个词都作为带引号的字符串传给 FTS5，输入中的引号、括号、AND/OR/NOT
+    等只当作普通字符，不会被解析为查询语法。
+    """
+    return " ".join('"' + term.replace('"', '""') + '"*' for term in text.split())
+
+
+def prefix_upper_bound(prefix):
+    """以 prefix 开头的字符串都小于返回值（按码点比较，与 SQLite 的 BINARY 排序一致）
+
+    把最后一个还能增加的字符加一并去掉其后的字符；不存在这样的上界时返回 None。
+    """
+    for index in range(len(prefix) - 1, -1, -1):
+        code = ord(prefix[index]) + 1
+        if 0xD800 <= code <= 0xDFFF:  # 代理码点不能出现在 UTF-8 字符串中
+            code = 0xE000
+        if code <= 0x10FFFF:
+            return prefix[:index] + chr(code)
+    return None
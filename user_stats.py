@@ -0,0 +1,147 @@
+"""用户统计：由触发器增量维护的计数器
+
+user_stats 只有一行，保存用户总数；user_domain_stats 保存每个邮箱域名的用户数；
+user_creation_stats 按分钟记录新建的用户数，用于计算最近的创建速率。
+触发器在写入 user 表的同一个事务中更新计数，ORM、批量语句、upsert 和异步引擎的
+写入都会被统计，读取统计信息只需按主键或索引读取几行。
+
+只有绕过触发器修改 user 表时计数才会偏离（例如滚动部署时仍在运行的旧版本进程），
+reconcile() 按 user 表重新计算总数和域名计数并返回修正量。
+"""
+
+import time
+
+# 创建速率统计保留的时间（分钟）
+CREATION_RETENTION = 24 * 60
+
+# 当前分钟（UNIX 时间），与 Python 中 int(time.time()) // 60 相同
+_MINUTE_SQL = "CAST(strftime('%s', 'now') AS INTEGER) / 60"
+
+STATS_DDL = (
+    "CREATE TABLE IF NOT EXISTS user_stats ("
+    "id INTEGER PRIMARY KEY CHECK (id = 1), total INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS user_domain_stats ("
+    "domain VARCHAR PRIMARY KEY, users INTEGER NOT NULL) WITHOUT ROWID",
+    # 按用户数取前几个域名时直接按索引顺序读取
+    "CREATE INDEX IF NOT EXISTS ix_user_domain_stats_users "
+    "ON user_domain_stats (users DESC, domain)",
+    "CREATE TABLE IF NOT EXISTS user_creation_stats ("
+    "minute INTEGER PRIMARY KEY, users INTEGER NOT NULL)",
+)
+
+_INCREMENT_DOMAIN = """
+        INSERT INTO user_domain_stats (domain, users) VALUES (new.email_domain, 1)
+        ON CONFLICT (domain) DO UPDATE SET users = users + 1;"""
+
+_DECREMENT_DOMAIN = """
+        UPDATE user_domain_stats SET users = users - 1 WHERE domain = old.email_domain;
+        DELETE FROM user_domain_stats WHERE domain = old.email_domain AND users <= 0;"""
+
+TRIGGER_DDL = (
+    f"""CREATE TRIGGER IF NOT EXISTS user_stats_insert AFTER INSERT ON user BEGIN
+        UPDATE user_stats SET total = total + 1 WHERE id = 1;{_INCREMENT_DOMAIN}
+        INSERT INTO user_creation_stats (minute, users) VALUES ({_MINUTE_SQL}, 1)
+        ON CONFLICT (minute) DO UPDATE SET users = users + 1;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS user_stats_delete AFTER DELETE ON user BEGIN
+        UPDATE user_stats SET total = total - 1 WHERE id = 1;{_DECREMENT_DOMAIN}
+    END""",
+    # 只有邮箱域名变化的更新才需要移动计数
+    f"""CREATE TRIGGER IF NOT EXISTS user_stats_update AFTER UPDATE OF email ON user
+    WHEN old.email_domain IS NOT new.email_domain BEGIN{_DECREMENT_DOMAIN}{_INCREMENT_DOMAIN}
+    END""",
+)
+
+
+def install(connection):
+    """创建统计表和触发器；统计表是新建的时按 user 表计算初始值"""
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_stats'"
+    ).first()
+    for statement in STATS_DDL + TRIGGER_DDL:
+        connection.exec_driver_sql(statement)
+    if not exists:
+        reconcile(connection)
+
+
+def drop(connection):
+    """删除统计表（触发器随 user 表一起删除）"""
+    for name in ("user_stats", "user_domain_stats", "user_creation_stats"):
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {name}")
+
+
+def read(connection, domains=20, now=None):
+    """总数、用户数最多的 domains 个域名和最近一小时、一天内新建的用户数"""
+    minute = int(time.time() if now is None else now) // 60
+    total = connection.exec_driver_sql(
+        "SELECT total FROM user_stats WHERE id = 1"
+    ).scalar()
+    top = connection.exec_driver_sql(
+        "SELECT domain, users FROM user_domain_stats "
+        "ORDER BY users DESC, domain LIMIT ?",
+        (domains,),
+    ).all()
+    created = {}
+    for name, window in (("last_hour", 60), ("last_day", CREATION_RETENTION)):
+        created[name] = connection.exec_driver_sql(
+            "SELECT coalesce(sum(users), 0) FROM user_creation_stats WHERE minute > ?",
+            (minute - window,),
+        ).scalar()
+    return {
+        "total": total or 0,
+        "domains": [{"domain": domain, "users": users} for domain, users in top],
+        "created_last_hour": created["last_hour"],
+        "created_last_day": created["last_day"],
+        "created_per_minute": created["last_hour"] / 60,
+    }
+
+
+def reconcile(connection, now=None):
+    """按 user 表重新计算总数和各域名计数，返回修正量（实际值减去原计数）
+
+    同时删除超出保留时间的创建速率记录。调用方负责提交事务。
+    """
+    # 先执行一条写语句取得写锁，之后读取的 user 表和计数在提交前不会被其他连接修改
+    connection.exec_driver_sql(
+        "INSERT OR IGNORE INTO user_stats (id, total) VALUES (1, 0)"
+    )
+    stored_total = connection.exec_driver_sql(
+        "SELECT total FROM user_stats WHERE id = 1"
+    ).scalar()
+    total = connection.exec_driver_sql("SELECT count(*) FROM user").scalar()
+    stored = dict(
+        connection.exec_driver_sql("SELECT domain, users FROM user_domain_stats").all()
+    )
+    actual = dict(
+        connection.exec_driver_sql(
+            "SELECT email_domain, count(*) FROM user GROUP BY email_domain"
+        ).all()
+    )
+
+    if total != stored_total:
+        connection.exec_driver_sql(
+            "UPDATE user_stats SET total = ? WHERE id = 1", (total,)
+        )
+    drift = {}
+    for domain in stored.keys() | actual.keys():
+        users = actual.get(domain, 0)
+        if users == stored.get(domain, 0):
+            continue
+        drift[domain] = users - stored.get(domain, 0)
+        if users:
+            connection.exec_driver_sql(
+                "INSERT INTO user_domain_stats (domain, users) VALUES (?, ?) "
+                "ON CONFLICT (domain) DO UPDATE SET users = excluded.users",
+                (domain, users),
+            )
+        else:
+            connection.exec_driver_sql(
+                "DELETE FROM user_domain_stats WHERE domain = ?", (domain,)
+            )
+
+    minute = int(time.time() if now is None else now) // 60
+    connection.exec_driver_sql(
+        "DELETE FROM user_creation_stats WHERE minute <= ?",
+        (minute - CREATION_RETENTION,),
+    )
+    return {"total": total - stored_total, "domains": drift}